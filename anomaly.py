@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+# =========================
+# STREAMING SURGE DETECTION
+# =========================
+# Every camera's dog count per local hour is compared with what that camera
+# usually sees at the same hour of the week: an exponentially weighted mean and
+# variance per (camera, hour-of-week) slot, folded in once when the hour closes.
+# Periods in which a slot saw nothing are folded in lazily, as zeros, the next
+# time it is touched, so each update is O(1) however long the gap. Slots with
+# too little history fall back to the camera's hour-of-day baseline. The
+# detection that pushes an hour past mean + SURGE_Z standard deviations (and
+# past SURGE_MIN_DOGS) is published as an escalated alert.
+
+SURGE_Z = 3.5
+SURGE_MIN_DOGS = 5     # never escalate an hour with fewer dogs than this
+MIN_STD = 1.0          # spread assumed for slots that have always been the same, in dogs
+DISPERSION = 2.0       # variance floor per dog of the mean: counts are at least Poisson, and dogs come in groups
+MIN_SAMPLES = 3        # periods a slot needs behind it before it is trusted
+REPLAY_DAYS = 56       # history replayed after a restart; older weeks barely move the averages (0.75^8, 0.9^56)
+ESCALATIONS_MAX = 500
+HOUR_NS = 3600 * 10**9
+EPOCH_WEEK_OFFSET = 72  # 1970-01-01 was a Thursday: hour-of-week slots start on Monday 00:00
+ESCALATION_COLUMNS = ["uid", "ts", "camera", "location", "dogs", "expected", "z", "basis"]
+
+
+class Baseline:
+    """EW mean / variance of hourly dog totals per (camera row, slot of a ``period_hours`` cycle)."""
+
+    def __init__(self, period_hours, offset_hours, alpha):
+        self.period, self.offset, self.alpha = period_hours, offset_hours, alpha
+        self.mean = np.zeros((0, period_hours))
+        self.var = np.zeros((0, period_hours))
+        self.n = np.zeros((0, period_hours), dtype=np.int64)
+        self.last = np.zeros((0, period_hours), dtype=np.int64)  # period of the last update
+
+    def grow(self, rows):
+        if rows <= len(self.mean): return
+        extra = max(rows, 2 * len(self.mean)) - len(self.mean)
+        def pad(a, fill): return np.vstack([a, np.full((extra, self.period), fill, dtype=a.dtype)])
+        self.mean, self.var, self.n, self.last = pad(self.mean, 0.0), pad(self.var, 0.0), pad(self.n, 0), pad(self.last, -1)
+
+    def _decayed(self, row, hour):
+        # (slot, period, mean, var, samples) with the k empty periods since the last update
+        # folded in as zeros, in closed form: mean * r and r * (var + mean^2 * (1 - r)), r = (1-alpha)^k
+        period, slot = divmod(hour + self.offset, self.period)
+        mean, var, n = float(self.mean[row, slot]), float(self.var[row, slot]), int(self.n[row, slot])
+        k = period - int(self.last[row, slot]) - 1
+        if n and k > 0:
+            r = (1 - self.alpha) ** k
+            mean, var, n = mean * r, r * (var + mean * mean * (1 - r)), n + k
+        return slot, period, mean, var, n
+
+    def update(self, row, hour, x):
+        slot, period, mean, var, n = self._decayed(row, hour)
+        if n == 0: mean, var = float(x), 0.0
+        else:
+            diff = x - mean
+            mean, var = mean + self.alpha * diff, (1 - self.alpha) * (var + self.alpha * diff * diff)
+        self.mean[row, slot], self.var[row, slot], self.n[row, slot], self.last[row, slot] = mean, var, n + 1, period
+
+    def expect(self, row, hour):
+        """``(mean, std, samples)`` for ``hour`` (local wall-clock hours since the epoch) before it is folded in."""
+        _, _, mean, var, n = self._decayed(row, hour)
+        return mean, np.sqrt(var), n
+
+
+class SurgeDetector:
+    """Owned by the poller thread; ``escalations`` (newest first) is replaced, never mutated."""
+
+    def __init__(self):
+        self.week = Baseline(168, EPOCH_WEEK_OFFSET, 0.25)
+        self.day = Baseline(24, 0, 0.1)
+        self.rows = {}  # camera -> row in the baselines
+        self.open = {}  # camera -> [hour, dogs so far, escalated]
+        self.escalations = pd.DataFrame(columns=ESCALATION_COLUMNS)
+
+    def expected(self, row, hour):
+        # the hour-of-week mean if the slot has enough weeks behind it, else the hour-of-day one;
+        # a few weeks of samples understate the spread, so it never drops below the day's or
+        # the count-data floor
+        day_mean, day_std, day_n = self.day.expect(row, hour)
+        if day_n < MIN_SAMPLES: return None
+        basis, (mean, std, n) = "week", self.week.expect(row, hour)
+        if n < MIN_SAMPLES: basis, mean, std = "day", day_mean, day_std
+        return basis, mean, max(std, day_std, np.sqrt(DISPERSION * max(mean, 0.0)), MIN_STD)
+
+    def replay(self, data) -> int:
+        """Start over from the last REPLAY_DAYS of a Dataset (after a restart or resync)."""
+        self.__init__()
+        if len(data) == 0: return 0
+        return self.feed(data.window(data.df["ts"].iat[0] - pd.Timedelta(days=REPLAY_DAYS)), data.cols)
+
+    def feed(self, df, cols) -> int:
+        """Fold new prepared rows in and return how many escalations they raised.
+
+        Rows for an hour a camera has already moved past only miss the baselines.
+        """
+        if len(df) == 0: return 0
+        df = df.sort_values("ts", kind="stable")
+        hours = df["ts"].dt.tz_localize(None).to_numpy("M8[ns]").astype(np.int64) // HOUR_NS
+        dogs = df[cols["dogs"]].to_numpy(np.int64)
+        found = []
+        for cam, idx in df.groupby(cols["cam"], observed=True, sort=False).indices.items():
+            row = self.rows.setdefault(cam, len(self.rows))
+            self.week.grow(len(self.rows))
+            self.day.grow(len(self.rows))
+            h, d = hours[idx], dogs[idx]
+            starts = np.flatnonzero(np.r_[True, h[1:] != h[:-1]])
+            ends = np.r_[starts[1:], len(h)]
+            for lo, hi, hour, dogs_in_hour in zip(starts.tolist(), ends.tolist(), h[starts].tolist(), np.add.reduceat(d, starts).tolist()):
+                cur = self.open.get(cam)
+                if cur is not None and hour < cur[0]: continue
+                if cur is None or hour > cur[0]:
+                    if cur is not None:
+                        self.week.update(row, cur[0], cur[1])
+                        self.day.update(row, cur[0], cur[1])
+                    cur = self.open[cam] = [hour, 0, False]
+                expected = None if cur[2] else self.expected(row, hour)
+                if expected is not None:
+                    basis, mean, std = expected
+                    threshold = max(SURGE_MIN_DOGS, mean + SURGE_Z * std)
+                    if cur[1] + dogs_in_hour >= threshold:
+                        over = int(np.argmax(cur[1] + np.cumsum(d[lo:hi]) >= threshold))
+                        i, n = idx[lo + over], cur[1] + int(d[lo:lo + over + 1].sum())
+                        found.append((df["uid"].iat[i], df["ts"].iat[i], cam, df[cols["loc"]].iat[i], n,
+                                      round(mean, 1), round((n - mean) / std, 1), basis))
+                        cur[2] = True
+                cur[1] += dogs_in_hour
+        if found:
+            new = pd.DataFrame(found, columns=ESCALATION_COLUMNS).sort_values("ts", ascending=False)
+            self.escalations = pd.concat([new, self.escalations], ignore_index=True).head(ESCALATIONS_MAX) if len(self.escalations) else new.reset_index(drop=True)
+        return len(found)
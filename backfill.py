@@ -0,0 +1,169 @@
+"""Bulk-load exported detection logs into the dashboard's local cache.
+
+    python backfill.py exports/2026-*.csv --source "$DATA_SOURCE" --cache-dir .cache/detections
+
+Exports are read in chunks by pandas' C parser; each chunk is normalised
+(timestamps, dogs, confidence, severity) and counted per hour, camera and
+location in a process pool, and the results are merged into the compacted
+history in ``archive.feather`` that the dashboard loads at start-up. Only rows
+from days before the live source's cached rows (``--source``, same spec as
+DATA_SOURCE) and not already in the archive are kept, and a detection repeated
+in several exports (same id and timestamp, or the same whole row without ids)
+is read from the first one only, so re-running a backfill, overlapping exports
+or overlapping the sheet never counts a detection twice; dropped rows are
+reported per file. Run it while the dashboard is stopped; it picks the history
+up on its next start.
+
+Incidents (see incidents.py) are counted per chunk into ``incidents.feather``
+the same way; an incident that straddles two chunks counts once in each.
+
+Malformed lines (too many fields) are skipped like the live ingest does, but
+reported here with file and line number. A line the parser cannot get past
+(an unbalanced quote swallows the rest of the file) ends that file: the rows
+before its chunk are kept, the rest is reported and the next file is read.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import store
+from incidents import INCIDENT_GAP_SEC, coalesce
+from ingest import clean_cols, skipped_lines
+from pipeline import TZ_NAME, prepare, resolve_columns, to_local
+from rollups import Rollups
+
+CHUNK_ROWS = 200_000
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield ``(first_row, raw_chunk, skipped_lines)``; line numbers are the file's."""
+    reader = pd.read_csv(path, dtype=str, engine="c", on_bad_lines="warn", chunksize=chunk_rows)
+    first = 0
+    with reader:
+        while True:
+            # the reader is lazy: warnings for a chunk are raised while it is read
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", pd.errors.ParserWarning)
+                try: raw = next(reader)
+                except StopIteration: return
+            yield first, raw, skipped_lines(caught)
+            first += len(raw)
+
+
+def row_keys(raw) -> np.ndarray:
+    """A hash per row identifying the detection: its id and timestamp, or the whole row without an id column."""
+    names = clean_cols(raw.iloc[:0]).columns
+    cols = resolve_columns(raw.iloc[:0].set_axis(names, axis=1))
+    key = raw.iloc[:, [names.get_loc(cols["id"]), names.get_loc(cols["ts"])]] if cols["id"] and cols["ts"] else raw
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+def seen_in(seen, keys) -> np.ndarray:
+    # membership in the sorted keys of earlier files
+    if len(seen) == 0: return np.zeros(len(keys), dtype=bool)
+    return seen[np.minimum(np.searchsorted(seen, keys), len(seen) - 1)] == keys
+
+
+def normalize(raw, first, before, archived, gap_sec=INCIDENT_GAP_SEC):
+    """Worker: prepare one chunk and count its rows and incidents from before ``before`` (a local midnight,
+    or None) that are not on the ``archived`` days. Also returns how many rows each of the two dropped."""
+    new = prepare(clean_cols(raw), id_offset=first)
+    if new is None: raise ValueError("export has no timestamp column")
+    df = new.df if before is None else new.window(None, before)
+    newer = len(new) - len(df)
+    if len(archived): df = df[~df["ts"].dt.normalize().isin(archived)]
+    return len(new), newer, len(new) - newer - len(df), Rollups().add(df, new.cols), Rollups().add(coalesce(df, new.cols, gap_sec), new.cols)
+
+
+def live_start(root, source):
+    """Local midnight of the first day the live source's cache covers, or None without a cache."""
+    loaded = store.load(root, source)
+    return loaded[0].df["ts"].iat[-1].normalize() if loaded is not None and len(loaded[0]) else None
+
+
+def archived_days(root, source) -> pd.DatetimeIndex:
+    """Local midnights of the days the archive already counts."""
+    archive = store.load_archive(root, source)
+    if archive is None: return pd.DatetimeIndex([], tz=TZ_NAME)
+    h = archive.hourly
+    return h.index[h["detections"] > 0].floor("D").unique()
+
+
+def merge_archive(root, source, total, compacted, name=store.ARCHIVE):
+    archive = store.load_archive(root, source, name)
+    if archive is not None: compacted = max(compacted, archive.compacted)
+    merged = (Rollups() if archive is None else archive).merge(total.compact(compacted))
+    store.save_archive(root, merged.before(compacted), source, name)
+
+
+def backfill(paths, source, root, workers=None, chunk_rows=CHUNK_ROWS, gap_sec=INCIDENT_GAP_SEC, report=sys.stderr):
+    before, archived = live_start(root, source), archived_days(root, source)
+    workers = workers or os.cpu_count() or 1
+    total, total_inc, rows, skipped, broken = Rollups(), Rollups(), 0, 0, 0
+    overlap = dict.fromkeys(["repeated", "live", "archived"], 0)
+    seen = np.zeros(0, dtype=np.uint64)  # row keys of the files already read
+    def collect(f):  # counts into the current file's ``dropped``
+        nonlocal rows, total, total_inc
+        n, newer, old, part, inc = f.result()
+        rows, total, total_inc = rows + n, total.merge(part), total_inc.merge(inc)
+        dropped["live"] += newer
+        dropped["archived"] += old
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        for path in paths:
+            pending, read, keys, dropped = [], 0, [], dict.fromkeys(overlap, 0)
+            try:
+                for first, raw, bad in read_chunks(path, chunk_rows):
+                    for line, reason in bad: print(f"{path}:{line}: skipped: {reason}", file=report)
+                    skipped += len(bad)
+                    read = first + len(raw)
+                    key = row_keys(raw)
+                    repeated = seen_in(seen, key)
+                    keys.append(key[~repeated])
+                    if repeated.any(): raw, dropped["repeated"] = raw[~repeated], dropped["repeated"] + int(repeated.sum())
+                    pending.append(pool.submit(normalize, raw, first, before, archived, gap_sec))
+                    # bound the chunks in flight so memory stays at a few chunks per worker
+                    while len(pending) > 2 * workers: collect(pending.pop(0))
+            except pd.errors.ParserError as e:
+                m = re.search(r"row (\d+)", str(e))  # the C parser counts file lines from 0
+                print(f"{path}:{int(m[1]) + 1 if m else '?'}: unreadable, skipped this file from data row {read + 1} on: {e}", file=report)
+                broken += 1
+            for f in pending: collect(f)
+            seen = np.union1d(seen, np.concatenate(keys)) if keys else seen
+            if any(dropped.values()):
+                print(f"{path}: not counted again: {dropped['repeated']} row(s) read from an earlier file, {dropped['archived']} on days "
+                      f"already archived, {dropped['live']} from the live source's days", file=report)
+            overlap = {k: v + dropped[k] for k, v in overlap.items()}
+
+    kept = len(total)
+    if kept:
+        # everything before the live source's first day counts as history; without one, up to the last backfilled day
+        compacted = before if before is not None else to_local(total.hourly.index[-1]).normalize() + pd.Timedelta(days=1)
+        # incidents first, like the live pipeline: the dashboard counts them from their archive's own cutoff
+        merge_archive(root, source, total_inc, compacted, store.INCIDENT_ARCHIVE)
+        merge_archive(root, source, total, compacted)
+    secs = time.perf_counter() - t0
+    return {"rows": rows, "kept": kept, "incidents": len(total_inc), "skipped_lines": skipped, "broken_files": broken,
+            "overlap": overlap, "seconds": round(secs, 2), "rows_per_s": round(rows / secs) if secs else None,
+            "before": None if before is None else str(before.date())}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("paths", nargs="+", help="exported CSV files")
+    ap.add_argument("--source", required=True, help="the dashboard's DATA_SOURCE (the cache is keyed on it)")
+    ap.add_argument("--cache-dir", default=os.environ.get("DASHBOARD_CACHE_DIR", ".cache/detections"))
+    ap.add_argument("--workers", type=int, help="processes normalising chunks (default: one per CPU)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--incident-gap", type=int, default=int(os.environ.get("DASHBOARD_INCIDENT_GAP_SEC", INCIDENT_GAP_SEC)),
+                    help="seconds between a camera's detections that still count as one incident (the dashboard's DASHBOARD_INCIDENT_GAP_SEC)")
+    a = ap.parse_args()
+    print(backfill(a.paths, a.source, a.cache_dir, a.workers, a.chunk_rows, a.incident_gap))
@@ -0,0 +1,319 @@
+"""Offline benchmarks for the dashboard data pipeline.
+
+    python benchmarks.py timestamps --sizes 10000 100000 1000000
+    python benchmarks.py startup --sizes 10000 100000
+    python benchmarks.py payload --sizes 1000 100000
+    python benchmarks.py stages --sizes 1000 100000 1000000 --out stages.csv
+    python benchmarks.py stages --baseline stages.csv
+    python benchmarks.py memory --sizes 3000   # detections per day over a simulated year
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from pipeline import TZ, parse_ts, parse_ts_series, prepare, resolve_columns, to_local
+
+# Strings seen in (or plausible for) the detection sheet, including the ones
+# both parsers must reject. Used to check the fast paths against the reference.
+TS_CORPUS = [
+    "01/02/2024 10:05", "1/2/2024 9:05", " 31/12/2023 23:59 ", "29/02/2024 00:00",
+    "2024-01-02T10:05:00", "2024-01-02T10:05:00+08:00", "2024-01-02T02:05:00Z",
+    "2024-01-02T10:05:00.123456-05:00", "2024-01-02T10:05:00.5Z", "2024-01-02 10:05:00",
+    "2024-01-02", "2024-01-02T10:05", "2024-01-02T10", "2024-01-02T10:05:00+05",
+    "2024-01-02T10:05:00+0530", "2024-01-02T24:00:00", "20240102T100500", "20240102T100500+0800",
+    "2024-W01-2", "2024-002", "2024-01-02t10:05:00", "2024-01-02T10:05:00 +08:00",
+    "", "   ", None, np.nan, "garbage", "10:05", "2024-1-2", "2024/01/02 10:05",
+    "32/01/2024 10:00", "30/02/2024 10:00", "01/02/2024 10:05 pm", "01/02/2024", "Tue 01/02/2024 10:05",
+    "2024-13-01T00:00:00", "01/01/1970 10:00", "1970-01-01T10:00:00",
+    "31/12/1981 23:50", "1981-12-31T23:50:00",  # inside the 1982 +07:30 -> +08:00 gap
+]
+
+
+def check_timestamps(values=TS_CORPUS):
+    s = pd.Series(values, dtype=object)
+    ref = s.apply(parse_ts)
+    ref = pd.to_datetime(ref, utc=True) if len(ref) else ref
+    got = parse_ts_series(s)
+    bad = [(v, a, b) for v, a, b in zip(values, ref, got) if not (pd.isna(a) and pd.isna(b)) and a != b]
+    if bad: raise AssertionError(f"parse_ts_series differs from parse_ts: {bad[:5]}")
+    return len(values)
+
+
+def synthetic_timestamps(n, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.Timestamp("2024-01-01")
+    t = base + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, n), unit="s")
+    kind = rng.integers(0, 10, n)
+    out = np.where(kind < 6, t.strftime("%d/%m/%Y %H:%M"), t.strftime("%Y-%m-%dT%H:%M:%S+08:00")).astype(object)
+    out[kind == 8] = t[kind == 8].strftime("%Y-%m-%dT%H:%M:%S")
+    out[kind == 9] = ""
+    return pd.Series(out)
+
+
+def synthetic_rows(n, seed=0, first_id=0) -> pd.DataFrame:
+    """Raw sheet rows as the CSV reader returns them (text cells, sheet column names)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Timestamp": synthetic_timestamps(n, seed).replace("", "01/01/2024 00:00"),
+        "Detection ID": [f"DET-{i:07d}" for i in range(first_id, first_id + n)],
+        "Dogs": rng.integers(0, 6, n),
+        "Confidence": rng.random(n).round(2),
+        "Status": rng.choice(["NEW", "RESOLVED", "ACK"], n),
+        "Camera": [f"CAM-{i:03d}" for i in rng.integers(0, 300, n)],
+        "Location": [f"SITE-{i:02d}" for i in rng.integers(0, 30, n)],
+        "Snapshot URL": [f"https://example.com/snap/{i}.jpg" for i in range(first_id, first_id + n)],
+    })
+
+
+def synthetic_sheet(n, seed=0, drop=()) -> bytes:
+    """A published-sheet style CSV (oldest row first, CRLF, no trailing newline) without the ``drop`` columns."""
+    df = synthetic_rows(n, seed).drop(columns=list(drop))
+    return df.to_csv(index=False, lineterminator="\r\n").rstrip().encode()
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    res = fn(*args)
+    return time.perf_counter() - t0, res
+
+
+def peak_mb(fn, *args):
+    # separate pass: tracemalloc slows allocation-heavy code down too much to time it at the same time
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_timestamps(sizes=(10_000, 100_000, 1_000_000)):
+    check_timestamps()
+    rows = []
+    for n in sizes:
+        s = synthetic_timestamps(n)
+        t_slow, ref = timed(lambda x: x.apply(parse_ts), s)
+        t_fast, got = timed(parse_ts_series, s)
+        assert pd.to_datetime(ref, utc=True).equals(got.dt.tz_convert("UTC")), f"mismatch at n={n}"
+        rows.append(dict(rows=n, apply_s=round(t_slow, 3), vectorized_s=round(t_fast, 3), speedup=round(t_slow / t_fast, 1)))
+    return pd.DataFrame(rows)
+
+
+_FIRST_RENDER = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+at.run()
+assert not at.exception, at.exception
+print(time.perf_counter() - t0)
+"""
+
+
+def first_render(csv_path, cache_dir):
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SHEET_CSV_URL=csv_path, DASHBOARD_CACHE_DIR=cache_dir, PYTHONPATH=here)
+    out = subprocess.run([sys.executable, "-c", _FIRST_RENDER, os.path.join(here, "dashboard.py")],
+                         env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+_PAYLOAD = """
+import sys
+from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+from streamlit.testing.v1 import AppTest
+sizes = []
+enqueue = ForwardMsgQueue.enqueue
+def counting(self, msg):
+    if msg.WhichOneof("type") == "delta": sizes[-1] += msg.ByteSize()
+    return enqueue(self, msg)
+ForwardMsgQueue.enqueue = counting
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+for _ in range(2):
+    sizes.append(0)
+    at.run()
+    assert not at.exception, at.exception
+print(*sizes)
+"""
+
+
+def rerun_payload(csv_path):
+    """Bytes of element deltas sent to the browser on the first run and on a plain rerun."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SHEET_CSV_URL=csv_path, DASHBOARD_CACHE_DIR="", PYTHONPATH=here)
+    out = subprocess.run([sys.executable, "-c", _PAYLOAD, os.path.join(here, "dashboard.py")],
+                         env=env, capture_output=True, text=True, check=True)
+    return [int(x) for x in out.stdout.strip().splitlines()[-1].split()]
+
+
+def bench_payload(sizes=(1_000, 100_000)):
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "sheet.csv")
+            with open(path, "wb") as f: f.write(synthetic_sheet(n))
+            first, rerun = rerun_payload(path)
+            rows.append(dict(rows=n, first_kb=round(first / 1024, 1), rerun_kb=round(rerun / 1024, 1)))
+    return pd.DataFrame(rows)
+
+
+SHEET_VARIANTS = {
+    "full": (),
+    "minimal": ("Detection ID", "Dogs", "Confidence", "Status", "Camera", "Location", "Snapshot URL"),  # timestamps only
+}
+
+
+def pipeline_stages(body):
+    """(stage, fn) pairs in pipeline order; each stage reads the previous one's output from ``out``."""
+    from anomaly import SurgeDetector
+    from incidents import incidents
+    from ingest import parse_csv_bytes
+    from rollups import Rollups
+    out = {}
+
+    def step(name, fn):
+        def run():
+            out[name] = fn()
+        return name, run
+
+    def lookups():
+        uids = out["prepare"].df["uid"]
+        return [out["prepare"].row(u) for u in uids.iloc[::max(1, len(uids) // 1000)]]
+
+    def kpis():
+        now = to_local(datetime.now(TZ))
+        return [out["rollups"].day(d) for d in (now.date(), (now - timedelta(days=1)).date())]
+
+    def analytics():
+        now = to_local(datetime.now(TZ))
+        r = out["rollups"]
+        return r.last_24h(now), r.daily(now - timedelta(days=7)), r.severity(now - timedelta(days=7))
+
+    def camera():
+        # what the camera filter costs: one partition Dataset, its rollups and its newest 50 rows
+        data, label = out["prepare"], out["prepare"].labels("cam")[0]
+        data._part_cache.clear()
+        return data.part("cam", label).df.head(50), out["rollups"].part("cam", label).day(datetime.now(TZ).date())
+
+    def window():
+        hi = out["prepare"].df["ts"].iat[0]
+        return out["prepare"].window(hi - timedelta(days=7), hi + timedelta(seconds=1)).head(50)
+
+    return [
+        step("read_csv", lambda: parse_csv_bytes(body)),
+        step("resolve_columns", lambda: resolve_columns(out["read_csv"])),
+        step("parse_ts", lambda: parse_ts_series(out["read_csv"][out["resolve_columns"]["ts"]])),
+        step("prepare", lambda: prepare(out["read_csv"])),
+        step("rollups", lambda: Rollups().add(out["prepare"].df, out["prepare"].cols)),
+        step("surges_replay", lambda: SurgeDetector().replay(out["prepare"])),
+        step("incidents", lambda: incidents(out["prepare"])),
+        step("kpis", kpis),
+        step("analytics", analytics),
+        step("row_lookup_x1000", lookups),
+        step("window_50", window),
+        step("camera_partition", camera),
+    ]
+
+
+def bench_stages(sizes=(1_000, 10_000, 100_000, 1_000_000), variants=tuple(SHEET_VARIANTS), render_max=100_000):
+    """Wall time and peak traced memory of every pipeline stage, plus a headless first render."""
+    rows = []
+    for n in sizes:
+        for variant in variants:
+            body = synthetic_sheet(n, drop=SHEET_VARIANTS[variant])
+            for stage, fn in pipeline_stages(body):
+                wall, _ = timed(fn)
+                rows.append(dict(rows=n, variant=variant, stage=stage, wall_s=round(wall, 4), peak_mb=round(peak_mb(fn), 1)))
+            if n <= render_max:
+                with tempfile.TemporaryDirectory() as d:
+                    path = os.path.join(d, "sheet.csv")
+                    with open(path, "wb") as f: f.write(body)
+                    rows.append(dict(rows=n, variant=variant, stage="first_render", wall_s=round(first_render(path, ""), 4), peak_mb=np.nan))
+    return pd.DataFrame(rows)
+
+
+def compare(res, baseline_path):
+    """Add the baseline's wall time and the ratio against it (>1 is slower than the baseline)."""
+    base = pd.read_csv(baseline_path)[["rows", "variant", "stage", "wall_s"]].rename(columns={"wall_s": "base_s"})
+    res = res.merge(base, on=["rows", "variant", "stage"], how="left")
+    res["ratio"] = (res["wall_s"] / res["base_s"]).round(2)
+    return res
+
+
+def resident_mb(data, rollups):
+    frame = data.df.memory_usage(deep=True).sum()
+    hourly = [rollups.hourly] + [r.hourly for p in rollups.parts.values() for r in p.values()]
+    return frame / 2**20, sum(h.memory_usage(deep=True).sum() for h in hourly) / 2**20
+
+
+def bench_memory(per_day=3000, days=365, hot_days=14, every=30):
+    """Feed a simulated year to the live pipeline one day per batch, with and without retention."""
+    from ingest import Snapshot, clean_cols
+    from live import LivePipeline
+    start = pd.Timestamp("2025-01-01")
+    rows = []
+    for policy in (None, hot_days):
+        pipe, snap = LivePipeline(None, hot_days=policy), Snapshot(0, None, "", 0.0)
+        for d in range(days):
+            raw = synthetic_rows(per_day, seed=d, first_id=d * per_day)
+            secs = np.sort(np.random.default_rng(d).integers(0, 86400, per_day))
+            raw["Timestamp"] = (start + pd.Timedelta(days=d) + pd.to_timedelta(secs, unit="s")).strftime("%Y-%m-%dT%H:%M:%S")
+            t, out = timed(pipe, snap, clean_cols(raw.astype(str)), d == 0, snap)
+            snap = snap._replace(version=d + 1, **out)
+            if (d + 1) % every == 0 or d + 1 == days:
+                frame_mb, rollup_mb = resident_mb(snap.data, snap.rollups)
+                rows.append(dict(hot_days=policy or "all", day=d + 1, ingested=(d + 1) * per_day, in_memory=len(snap.data),
+                                 frame_mb=round(frame_mb, 1), rollups_mb=round(rollup_mb, 1), batch_s=round(t, 3)))
+    return pd.DataFrame(rows)
+
+
+def bench_startup(sizes=(10_000, 100_000), render=True):
+    """Time to a ready snapshot (and to the first full script run) with a cold vs warm local cache."""
+    from fake_sheet import serve
+    from live import start_poller
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            path, cache = os.path.join(d, "sheet.csv"), os.path.join(d, "cache")
+            with open(path, "wb") as f: f.write(synthetic_sheet(n))
+            srv = serve(path)
+            url = f"http://127.0.0.1:{srv.server_address[1]}/"
+            t_cold, p = timed(start_poller, url, 3600, cache)
+            p.stop()
+            t_warm, p = timed(start_poller, url, 3600, cache)
+            assert len(p.snapshot.data) == n
+            p.stop()
+            row = dict(rows=n, cold_s=round(t_cold, 3), warm_s=round(t_warm, 3))
+            if render:
+                row["render_cold_s"] = round(first_render(url, ""), 3)
+                row["render_warm_s"] = round(first_render(url, cache), 3)
+            srv.shutdown()
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("bench", choices=["timestamps", "startup", "payload", "stages", "memory"])
+    ap.add_argument("--sizes", type=int, nargs="+")
+    ap.add_argument("--out", help="stages: also write the results to this CSV")
+    ap.add_argument("--baseline", help="stages: CSV from an earlier --out run to compare against")
+    a = ap.parse_args()
+    if a.bench == "timestamps": print(bench_timestamps(a.sizes or [10_000, 100_000, 1_000_000]).to_string(index=False))
+    if a.bench == "startup": print(bench_startup(a.sizes or [10_000, 100_000]).to_string(index=False))
+    if a.bench == "payload": print(bench_payload(a.sizes or [1_000, 100_000]).to_string(index=False))
+    if a.bench == "memory": print(bench_memory(*(a.sizes or [3000])).to_string(index=False))
+    if a.bench == "stages":
+        sizes = a.sizes or (sorted(pd.read_csv(a.baseline)["rows"].unique()) if a.baseline else [1_000, 10_000, 100_000, 1_000_000])
+        res = bench_stages(sizes)
+        if a.out: res.to_csv(a.out, index=False)
+        if a.baseline: res = compare(res, a.baseline)
+        print(res.to_string(index=False))
@@ -1,26 +1,42 @@
+import os
+import threading
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-from dateutil import parser
 import plotly.graph_objects as go
-from streamlit_autorefresh import st_autorefresh
+from images import ImageCache
+from incidents import INCIDENT_GAP_SEC, incident_of
+from live import recent as recent_rows, start_poller
+from metrics import METRICS
+from pipeline import TZ
 
 # =========================
 # CONFIG
 # =========================
 st.set_page_config(page_title="Stray Dog Detection System", layout="wide")
-TZ = ZoneInfo("Asia/Kuala_Lumpur")
-SHEET_CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSxyGtEAyftAfaY3M3H_sMvnA6oYcTsVjxMLVznP7SXvGA4rTXfrvzESYgSND7Z6o9qTrD-y0QRyvPo/pub?gid=0&single=true&output=csv"
-REFRESH_SEC = 8
+SHEET_CSV_URL = os.environ.get("SHEET_CSV_URL") or "https://docs.google.com/spreadsheets/d/e/2PACX-1vSxyGtEAyftAfaY3M3H_sMvnA6oYcTsVjxMLVznP7SXvGA4rTXfrvzESYgSND7Z6o9qTrD-y0QRyvPo/pub?gid=0&single=true&output=csv"
+# CSV path/URL (default: the published sheet), jsonl:///path/log.jsonl, sqlite:///path/db.sqlite?table=detections,
+# or push://127.0.0.1:8765 to have the detector POST rows to the dashboard (see sources.PushSource)
+DATA_SOURCE = os.environ.get("DATA_SOURCE") or SHEET_CSV_URL
+PUSH = DATA_SOURCE.startswith("push://")
+REFRESH_SEC = 8   # how often the shared poller checks the sheet (and the panels redraw)
+LIVE_SEC = 1 if PUSH else REFRESH_SEC  # how often each session's live panels pick up the newest snapshot
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR", ".cache/detections")  # "" disables the warm-start cache
+HOT_DAYS = int(os.environ.get("DASHBOARD_HOT_DAYS", "14"))  # raw rows kept in memory; older days only as hourly/daily counts (0 keeps all)
+INCIDENT_GAP_SEC = int(os.environ.get("DASHBOARD_INCIDENT_GAP_SEC", INCIDENT_GAP_SEC))  # a camera's detections closer than this are one incident
+IMAGE_CACHE_DIR = os.environ.get("DASHBOARD_IMAGE_DIR", ".cache/images")  # "" embeds snapshot URLs directly
+IMAGE_CACHE_MB = 256
+WEBGL_MIN_POINTS = 1000  # switch line charts to Scattergl from this many points
+ADMIN_KEY = os.environ.get("DASHBOARD_ADMIN_KEY", "")  # ?admin=<key> shows the stage timings sidebar
+METRICS_FILE = os.environ.get("DASHBOARD_METRICS_FILE", "")  # *.prom for Prometheus text, anything else appends JSON lines
 
 # Constants
-SINGLE_CAMERA_NAME = "WEBCAM"
-SINGLE_LOCATION_NAME = "WEBCAM"
 SCROLLABLE_AREA_HEIGHT = 420  
-
-st_autorefresh(interval=REFRESH_SEC * 1000, key="auto_refresh")
+ALERTS_PAGE = 25   # rows per Active Alerts page
+ALERTS_MAX = 500   # newest alerts reachable through the pager
+EVENTS_PAGE = 50   # rows per Recent Detection Events page
+SURGE_SHOW_HOURS = 6  # escalated alerts this recent are pinned above the Active Alerts table
 
 # =========================
 # CSS: THE "NUCLEAR" LIGHT MODE FORCE
@@ -158,41 +174,6 @@ h1, h2, h3, h4, h5, h6, p, div, span, label, li, a {{
 # =========================
 # HELPERS
 # =========================
-def _clean_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
-    return df
-
-def parse_ts(x):
-    if pd.isna(x): return pd.NaT
-    s = str(x).strip()
-    if s == "": return pd.NaT
-    try:
-        if "/" in s and ":" in s and "t" not in s.lower():
-            dt = datetime.strptime(s, "%d/%m/%Y %H:%M")
-            return dt.replace(tzinfo=TZ)
-    except: pass
-    try:
-        dt = parser.isoparse(s)
-        if dt.tzinfo is None: dt = dt.replace(tzinfo=TZ)
-        return dt.astimezone(TZ)
-    except: return pd.NaT
-
-def pick_col(df, candidates):
-    for c in candidates:
-        if c in df.columns: return c
-    return None
-
-def coerce_int_series(s, default=1):
-    return pd.to_numeric(s, errors="coerce").fillna(default).clip(lower=0).astype(int)
-
-def normalize_confidence(series):
-    x = pd.to_numeric(series, errors="coerce")
-    if x.notna().sum() == 0: return x
-    med = np.nanmedian(x.values.astype(float))
-    if med <= 1.0: x = x * 100.0
-    return x.clip(0, 100)
-
 def severity_badge(sev):
     sev = str(sev).strip().upper()
     if sev == "LOW": return "sev-badge", "LOW", "#dbeafe", "#1d4ed8"
@@ -236,80 +217,139 @@ def delta_chip(pct):
     if pct >= 0: return f'<span style="color:#b91c1c; font-weight:bold; font-size:12px">+{pct:.0f}%</span>'
     return f'<span style="color:#16a34a; font-weight:bold; font-size:12px">{pct:.0f}%</span>'
 
-@st.cache_data(ttl=REFRESH_SEC, show_spinner=False)
+@st.cache_resource(show_spinner=False)
+def sheet_poller(url):
+    # one background fetcher per process, shared by every session; it prepares
+    # each batch of new rows once and publishes the result as an immutable snapshot
+    _load_state.missed = True
+    return start_poller(url, REFRESH_SEC, CACHE_DIR, HOT_DAYS or None, INCIDENT_GAP_SEC)
+
+_load_state = threading.local()  # cached functions run in the caller's thread, so this tells hits from misses
+
+@st.cache_resource(show_spinner=False)
+def image_cache():
+    return ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MB * 1024 * 1024) if IMAGE_CACHE_DIR else None
+
+def snapshot_image(url, thumb=False):
+    # cached bytes (served by Streamlit under a content-hashed URL) or, if the
+    # snapshot host can't be reached, the original URL for the browser to try
+    cache = image_cache()
+    body = None if cache is None else (cache.thumb(url) if thumb else cache.get(url))
+    return url if body is None else body
+
+def line_trace(x, y, name):
+    # WebGL only pays off for long series; a handful of points renders faster as SVG
+    trace = go.Scattergl if len(x) >= WEBGL_MIN_POINTS else go.Scatter
+    return trace(x=x, y=y, mode="lines+markers", name=name)
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def analytics_figure(mode, url, version, hour, scope, raw, _roll):
+    # charts only change with the data version or when the hour rolls over, so one figure
+    # per (mode, version, hour, camera/location, view) is shared by every session (treat it as read-only)
+    counted = "Detections" if raw else "Incidents"
+    if mode == "24 Hours":
+        hourly = _roll.last_24h(hour)
+        fig = go.Figure()
+        fig.add_trace(line_trace(hourly["hour"], hourly["detections"], counted))
+        fig.add_trace(line_trace(hourly["hour"], hourly["dogs"], "Dogs"))
+        # Force Chart Text Color to Dark
+        fig.update_layout(template="plotly_white", margin=dict(l=10, r=10, t=10, b=10), height=300, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#000000'), xaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), yaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), legend=dict(font=dict(color='#000000')))
+        return fig
+
+    if mode == "7 Days":
+        daily = _roll.daily(hour - timedelta(days=7))
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=daily["day"].astype(str), y=daily["detections"], name=counted))
+        fig.add_trace(go.Bar(x=daily["day"].astype(str), y=daily["dogs"], name="Dogs"))
+        # Force Chart Text Color to Dark
+        fig.update_layout(template="plotly_white", barmode="group", margin=dict(l=10, r=10, t=10, b=10), height=300, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#000000'), xaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), yaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), legend=dict(font=dict(color='#000000')))
+        return fig
+
+    counts = _roll.severity(hour - timedelta(days=7))
+    fig = go.Figure(data=[go.Pie(labels=list(counts.index), values=list(counts.values), hole=0.6)])
+    # Force Chart Text Color to Dark
+    fig.update_layout(template="plotly_white", margin=dict(l=10, r=10, t=10, b=10), height=300, paper_bgcolor='rgba(0,0,0,0)', font=dict(color='#000000'), legend=dict(font=dict(color='#000000')))
+    return fig
+
 def load_data(url):
-    df = pd.read_csv(url, dtype=str, engine="python", on_bad_lines="skip")
-    return _clean_cols(df)
+    _load_state.missed = False
+    with METRICS.timer("page.load_data"): snap = sheet_poller(url).snapshot
+    METRICS.inc("load_data_misses" if _load_state.missed else "load_data_hits")
+    return snap
+
+def export_metrics():
+    if METRICS_FILE: METRICS.export(METRICS_FILE)
+
+@st.fragment(run_every=LIVE_SEC)
+def wait_for_data(url):
+    # the only page-wide rerun: leave the empty state once the first detections arrive;
+    # after that every panel refreshes itself from the newest snapshot (see below)
+    snap = sheet_poller(url).snapshot
+    if snap.data is not None and len(snap.data): st.rerun()
 
 # =========================
 # DATA LOADING
 # =========================
-raw = load_data(SHEET_CSV_URL)
-if raw.empty: st.stop()
-
-col_ts = pick_col(raw, ["timestamp", "time", "datetime", "date_time"])
-col_id = pick_col(raw, ["detection_id", "det_id", "id", "event_id"])
-col_loc = pick_col(raw, ["location", "area", "zone"])
-col_cam = pick_col(raw, ["camera", "camera_id", "cam"])
-col_camtype = pick_col(raw, ["camera_type", "type"])
-col_dogs = pick_col(raw, ["dogs", "dog_count", "num_dogs"])
-col_conf = pick_col(raw, ["confidence", "conf", "score"])
-col_sev = pick_col(raw, ["severity", "priority", "level"])
-col_status = pick_col(raw, ["status", "alert_status"])
-img_candidates = [c for c in raw.columns if ("url" in c or "image" in c or "snapshot" in c or "photo" in c)]
-col_img = pick_col(raw, ["snapshot_url", "image_url", "url"]) or (img_candidates[0] if img_candidates else None)
-
-if col_ts is None: st.stop()
-
-df = raw.copy()
-df["ts"] = df[col_ts].apply(parse_ts)
-df = df.dropna(subset=["ts"]).copy()
-
-if col_id is None: df["detection_id"] = ["DET-" + str(i).zfill(6) for i in range(1, len(df) + 1)]; col_id = "detection_id"
-if col_cam is None: df["camera"] = SINGLE_CAMERA_NAME; col_cam = "camera"
-if col_camtype is None: df["camera_type"] = SINGLE_CAMERA_NAME; col_camtype = "camera_type"
-if col_loc is None: df["location"] = SINGLE_LOCATION_NAME; col_loc = "location"
-if col_dogs is None: df["dogs"] = 1; col_dogs = "dogs"
-if col_conf is None: df["confidence"] = np.nan; col_conf = "confidence"
-if col_status is None: df["status"] = "NEW"; col_status = "status"
-
-df[col_dogs] = coerce_int_series(df[col_dogs], default=1)
-df[col_conf] = normalize_confidence(df[col_conf])
-if col_sev is None:
-    dnum = df[col_dogs].astype(int)
-    df["severity"] = np.where(dnum >= 4, "CRITICAL", np.where(dnum >= 3, "HIGH", np.where(dnum >= 2, "MEDIUM", "LOW")))
-    col_sev = "severity"
-
-df[col_cam] = SINGLE_CAMERA_NAME
-df[col_camtype] = SINGLE_CAMERA_NAME
-df[col_loc] = SINGLE_LOCATION_NAME
-df["date_local"] = df["ts"].dt.date
-df["hour"] = df["ts"].dt.hour
-df_sorted = df.sort_values("ts", ascending=False).reset_index(drop=True)
-
-def row_uid(r): return f"{str(r[col_id])}__{r['ts'].isoformat()}"
+snap = load_data(DATA_SOURCE)
+if snap.data is None or len(snap.data) == 0:
+    if PUSH: st.info(f"Waiting for the detector to POST detections to {DATA_SOURCE.replace('push://', 'http://')}/")
+    wait_for_data(DATA_SOURCE)
+    st.stop()
+
 if "selected_alert_uid" not in st.session_state: st.session_state.selected_alert_uid = ""
-if st.session_state.selected_alert_uid == "" and len(df_sorted) > 0:
-    st.session_state.selected_alert_uid = row_uid(df_sorted.iloc[0])
 
-def get_selected_row():
-    uid = st.session_state.selected_alert_uid
-    if uid == "": return None
-    m = df_sorted.apply(lambda rr: row_uid(rr) == uid, axis=1)
-    if m.sum() == 0: return None
-    return df_sorted[m].iloc[0]
-
-now = datetime.now(TZ)
-today = now.date()
-yday = (now - timedelta(days=1)).date()
-today_df = df_sorted[df_sorted["date_local"] == today]
-yday_df = df_sorted[df_sorted["date_local"] == yday]
-new_today = int((today_df[col_status].astype(str).str.upper() == "NEW").sum())
-new_yday = int((yday_df[col_status].astype(str).str.upper() == "NEW").sum())
-dogs_today = int(today_df[col_dogs].sum())
-dogs_yday = int(yday_df[col_dogs].sum())
-hp_today = int(today_df[col_sev].astype(str).str.upper().isin(["HIGH", "CRITICAL"]).sum())
-hp_yday = int(yday_df[col_sev].astype(str).str.upper().isin(["HIGH", "CRITICAL"]).sum())
+def column_names(data):
+    return (data.cols[k] for k in ("ts", "id", "loc", "cam", "camtype", "dogs", "conf", "sev", "status", "img"))
+
+def scope_label(scope):
+    if not scope: return "All cameras"
+    role, label = scope.split(":", 1)
+    return f"📷 {label}" if role == "cam" else f"📍 {label}"
+
+def scoped(obj):
+    # the chosen camera's / location's own partition of a Dataset or Rollups (kept up to
+    # date by the poller), so nothing below re-filters the full frame
+    scope = st.session_state.get("scope", "")
+    return obj.part(*scope.split(":", 1)) if scope else obj
+
+def scoped_escalations(esc):
+    scope = st.session_state.get("scope", "")
+    if esc is None or not scope: return esc
+    role, label = scope.split(":", 1)
+    return esc[esc["camera" if role == "cam" else "location"] == label]
+
+def raw_view(snap):
+    return bool(st.session_state.get("raw_rows")) or snap.incidents is None
+
+def viewed(snap):
+    # incidents (repeated detections of the same dogs merged) unless the raw rows were asked for
+    return (snap.data, snap.rollups) if raw_view(snap) else (snap.incidents, snap.incident_rollups)
+
+def surge_alerts(esc, inc):
+    # escalations keyed by the uid of the alert row they belong to: the detection's own or its incident's
+    out = {}
+    for e in [] if esc is None else esc.to_dict("records"):
+        out.setdefault(e["uid"] if inc is None else incident_of(inc, e["camera"], e["ts"]) or e["uid"], e)
+    return out
+
+def stale_warning(error, snap):
+    # the poller keeps serving its last good snapshot when a refresh fails; say so instead of looking live
+    if error is None: return
+    age = f"last updated {time_ago(datetime.fromtimestamp(snap.fetched_at, TZ), datetime.now(TZ))}" if snap.fetched_at else "restored from the local cache"
+    st.warning(f"Could not refresh detections from the data source ({type(error).__name__}: {error}). Showing data {age}.", icon="⚠️")
+
+def surge_text(e):
+    return f"{e['dogs']} dogs at {e['camera']} in the {e['ts']:%a %H}:00 hour, usually ~{e['expected']:.1f} (z {e['z']:.1f})"
+
+def select_alert(uid):
+    st.session_state.selected_alert_uid = uid
+    # a new key drops the Active Alerts table's row selection along with its widget state
+    st.session_state.alerts_table = st.session_state.get("alerts_table", 0) + 1
+
+def pick_alert(key, uids):
+    # on_select callback: runs only when the table's selection changes, so it never undoes a surge click
+    rows = st.session_state[key].selection.rows
+    if rows: st.session_state.selected_alert_uid = uids[rows[0]]
 
 # =========================
 # HEADER
@@ -325,158 +365,207 @@ st.markdown(
 )
 
 # =========================
-# ROW 1: 3 KPI CARDS
+# CAMERA / LOCATION FILTER
 # =========================
-k1, k2, k3 = st.columns(3, gap="large")
-
-with k1:
-    st.markdown(f"""
-    <div class="kpi-card">
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <div style="font-size:28px;">⛔</div>
-            {delta_chip(pct_change(new_today, new_yday))}
+f_scope, f_view = st.columns([4, 1], vertical_alignment="bottom")
+cams, locs = snap.data.labels("cam"), snap.data.labels("loc")
+if len(cams) > 1 or len(locs) > 1:
+    options = [""] + [f"cam:{c}" for c in cams] + [f"loc:{l}" for l in locs]
+    current = st.session_state.get("scope", "")
+    # no widget key: passing the current choice as the default keeps it when cameras come and go
+    with f_scope: st.session_state.scope = st.selectbox("Camera / location", options, index=options.index(current) if current in options else 0, format_func=scope_label)
+else:
+    st.session_state.scope = ""
+with f_view: st.toggle("Raw detections", key="raw_rows", help=f"Count every detection row instead of incidents (a camera's detections less than {INCIDENT_GAP_SEC}s apart)")
+
+@st.fragment(run_every=LIVE_SEC)
+def live_panels():
+    # reruns on its own against the newest snapshot, so "x min ago" labels, today's
+    # counts and alert selection update without re-executing the rest of the page
+    lap = METRICS.laps("page.")
+    snap = load_data(DATA_SOURCE)
+    stale_warning(sheet_poller(DATA_SOURCE).error, snap)
+    if snap.data is None or len(snap.data) == 0: return
+    raw = raw_view(snap)
+    data, roll = (scoped(x) for x in viewed(snap))
+    surges = surge_alerts(scoped_escalations(snap.escalations), None if raw else snap.incidents)
+    df_sorted = data.df
+    col_ts, col_id, col_loc, col_cam, col_camtype, col_dogs, col_conf, col_sev, col_status, col_img = column_names(data)
+    uid = st.session_state.selected_alert_uid
+    if len(df_sorted) and (uid == "" or data.row(uid) is None): st.session_state.selected_alert_uid = df_sorted["uid"].iat[0]
+
+    def get_selected_row():
+        uid = st.session_state.selected_alert_uid
+        if uid == "": return None
+        return data.row(uid)
+
+    now = datetime.now(TZ)
+    today = now.date()
+    yday = (now - timedelta(days=1)).date()
+    kpi_today, kpi_yday = roll.day(today), roll.day(yday)
+    new_today, new_yday = int(kpi_today["new"]), int(kpi_yday["new"])
+    dogs_today, dogs_yday = int(kpi_today["dogs"]), int(kpi_yday["dogs"])
+    hp_today, hp_yday = int(kpi_today["high"]), int(kpi_yday["high"])
+
+    # =========================
+    # ROW 1: 3 KPI CARDS
+    # =========================
+    k1, k2, k3 = st.columns(3, gap="large")
+
+    with k1:
+        st.markdown(f"""
+        <div class="kpi-card">
+            <div style="display:flex; justify-content:space-between; align-items:center;">
+                <div style="font-size:28px;">⛔</div>
+                {delta_chip(pct_change(new_today, new_yday))}
+            </div>
+            <div style="font-size:42px; font-weight:900; margin-top:5px; color:#0d0700 !important;">{new_today}</div>
+            <div style="font-weight:bold; color:#64748b !important; font-size:14px;">New Alerts</div>
         </div>
-        <div style="font-size:42px; font-weight:900; margin-top:5px; color:#0d0700 !important;">{new_today}</div>
-        <div style="font-weight:bold; color:#64748b !important; font-size:14px;">New Alerts</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-with k2:
-    st.markdown(f"""
-    <div class="kpi-card">
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <div style="font-size:28px;">📊</div>
-            {delta_chip(pct_change(dogs_today, dogs_yday))}
+        """, unsafe_allow_html=True)
+
+    with k2:
+        st.markdown(f"""
+        <div class="kpi-card">
+            <div style="display:flex; justify-content:space-between; align-items:center;">
+                <div style="font-size:28px;">📊</div>
+                {delta_chip(pct_change(dogs_today, dogs_yday))}
+            </div>
+            <div style="font-size:42px; font-weight:900; margin-top:5px; color:#0d0700 !important;">{dogs_today}</div>
+            <div style="font-weight:bold; color:#64748b !important; font-size:14px;">Total Stray Dogs Detected</div>
         </div>
-        <div style="font-size:42px; font-weight:900; margin-top:5px; color:#0d0700 !important;">{dogs_today}</div>
-        <div style="font-weight:bold; color:#64748b !important; font-size:14px;">Total Stray Dogs Detected</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-with k3:
-    st.markdown(f"""
-    <div class="kpi-card">
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <div style="font-size:28px;">🚨</div>
-            {delta_chip(pct_change(hp_today, hp_yday))}
+        """, unsafe_allow_html=True)
+
+    with k3:
+        st.markdown(f"""
+        <div class="kpi-card">
+            <div style="display:flex; justify-content:space-between; align-items:center;">
+                <div style="font-size:28px;">🚨</div>
+                {delta_chip(pct_change(hp_today, hp_yday))}
+            </div>
+            <div style="font-size:42px; font-weight:900; margin-top:5px; color:#0d0700 !important;">{hp_today}</div>
+            <div style="font-weight:bold; color:#64748b !important; font-size:14px;">High Priority</div>
         </div>
-        <div style="font-size:42px; font-weight:900; margin-top:5px; color:#0d0700 !important;">{hp_today}</div>
-        <div style="font-weight:bold; color:#64748b !important; font-size:14px;">High Priority</div>
-    </div>
-    """, unsafe_allow_html=True)
+        """, unsafe_allow_html=True)
 
-st.markdown('<div style="height:30px;"></div>', unsafe_allow_html=True)
+    st.markdown('<div style="height:30px;"></div>', unsafe_allow_html=True)
 
-# =========================
-# ROW 2: 3 FEATURE CARDS
-# =========================
-c1, sep1, c2, sep2, c3 = st.columns([1, 0.05, 1, 0.05, 1])
+    lap("kpis")
 
-# --- CARD 4: CAMERA ---
-with c1:
-    with st.container(border=True):
-        st.subheader("📷 Camera Feeds & Snapshots")
-        st.caption("Latest detection (single feed)")
+    # =========================
+    # ROW 2: 3 FEATURE CARDS
+    # =========================
+    c1, sep1, c2, sep2, c3 = st.columns([1, 0.05, 1, 0.05, 1])
+
+    # --- CARD 4: CAMERA ---
+    with c1:
+        with st.container(border=True):
+            st.subheader("📷 Camera Feeds & Snapshots")
+            st.caption(f"Latest detection · {scope_label(st.session_state.get('scope', ''))}")
         
-        with st.container(height=SCROLLABLE_AREA_HEIGHT, border=False):
-            if len(df_sorted) == 0:
-                st.info("No data.")
-            else:
-                r = df_sorted.iloc[0]
-                uid = row_uid(r)
-                time_display = time_ago(r["ts"], now)
-                
-                img_ok = (col_img is not None) and str(r.get(col_img, "")).startswith("http")
-                if img_ok:
-                    st.markdown(f"""
-                    <div class="thumb">
-                        <img src="{str(r[col_img])}" />
-                        <div style="position:absolute; top:10px; left:10px;">
-                           <span style="background:#22c55e; color:white !important; padding:4px 8px; border-radius:6px; font-size:11px; font-weight:bold;">LIVE</span>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
+            with st.container(height=SCROLLABLE_AREA_HEIGHT, border=False):
+                if len(df_sorted) == 0:
+                    st.info("No data.")
                 else:
-                    st.markdown("""<div class="thumb" style="height:220px;display:flex;align-items:center;justify-content:center;background:#f1f5f9;color:#64748b !important;font-weight:bold;">No Image</div>""", unsafe_allow_html=True)
+                    r = df_sorted.iloc[0]
+                    time_display = time_ago(r["ts"], now)
                 
-                st.markdown(f"<div style='margin-top:10px; font-weight:bold; color:#0f172a !important;'>{str(r[col_loc])}</div>", unsafe_allow_html=True)
-                st.markdown(f"<div class='small-muted'>{time_display} • {int(r[col_dogs])} dogs</div>", unsafe_allow_html=True)
-                st.markdown("<div style='height:10px'></div>", unsafe_allow_html=True)
+                    img_ok = (col_img is not None) and str(r.get(col_img, "")).startswith("http")
+                    if img_ok:
+                        st.markdown('<span style="background:#22c55e; color:white !important; padding:4px 8px; border-radius:6px; font-size:11px; font-weight:bold;">LIVE</span>', unsafe_allow_html=True)
+                        st.image(snapshot_image(str(r[col_img]), thumb=True), use_container_width=True)
+                    else:
+                        st.markdown("""<div class="thumb" style="height:220px;display:flex;align-items:center;justify-content:center;background:#f1f5f9;color:#64748b !important;font-weight:bold;">No Image</div>""", unsafe_allow_html=True)
+                
+                    st.markdown(f"<div style='margin-top:10px; font-weight:bold; color:#0f172a !important;'>{str(r[col_loc])}</div>", unsafe_allow_html=True)
+                    st.markdown(f"<div class='small-muted'>{time_display} • {int(r[col_dogs])} dogs</div>", unsafe_allow_html=True)
+                    st.markdown("<div style='height:10px'></div>", unsafe_allow_html=True)
 
-# --- SEPARATOR 1 ---
-with sep1:
-    st.markdown('<div class="vertical-line"></div>', unsafe_allow_html=True)
+    # --- SEPARATOR 1 ---
+    with sep1:
+        st.markdown('<div class="vertical-line"></div>', unsafe_allow_html=True)
 
-# --- CARD 5: ALERTS ---
-with c2:
-    with st.container(border=True):
-        st.subheader("⛔ Active Alerts")
-        st.caption("Scroll for more")
+    # --- CARD 5: ALERTS ---
+    with c2:
+        with st.container(border=True):
+            st.subheader("⛔ Active Alerts")
+            st.caption("Select a row to view it")
 
-        with st.container(height=SCROLLABLE_AREA_HEIGHT, border=False):
             if len(df_sorted) == 0:
                 st.info("No alerts.")
             else:
-                lim = min(len(df_sorted), 100)
-                for i in range(lim):
-                    r = df_sorted.iloc[i]
-                    uid = row_uid(r)
-                    cls, sev_txt, bg, col = severity_badge(r[col_sev])
-                    
+                # escalated alerts: unusually many dogs for this camera at this hour of the week
+                for uid, e in list(surges.items())[:3]:
+                    if now - e["ts"] > timedelta(hours=SURGE_SHOW_HOURS): break
+                    st.button(f"🚨 {surge_text(e)}", key=f"surge_{uid}", on_click=select_alert, args=(uid,), use_container_width=True)
+                n_pages = -(-min(len(df_sorted), ALERTS_MAX) // ALERTS_PAGE)
+                page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key="alerts_page") if n_pages > 1 else 1
+                rows = df_sorted.iloc[(page - 1) * ALERTS_PAGE:page * ALERTS_PAGE]
+                badges = [("sev-badge", f"SURGE · {sev}", "#7f1d1d", "#ffffff") if u in surges else severity_badge(sev)
+                          for u, sev in zip(rows["uid"], rows[col_sev])]
+                page_df = pd.DataFrame({
+                    "Detection": rows[col_id].astype(str).to_numpy(),
+                    "Dogs": rows[col_dogs].astype(int).to_numpy(),
+                    "Severity": [b[1] for b in badges],
+                    "Location": rows[col_loc].astype(str).to_numpy(),
+                    "When": [time_ago(t, now) for t in rows["ts"]],
+                })
+                if not raw: page_df["Seen"] = [f"{n}×" for n in rows["detections"]]
+                styles = [f"background-color:{b[2]}; color:{b[3]}; font-weight:bold" for b in badges]
+                # one element per page; keyed on the page's newest row so the checkbox state
+                # resets (instead of pointing at a shifted row) when new alerts arrive
+                key, uids = f"alerts_{page}_{rows['uid'].iat[0]}_{st.session_state.get('alerts_table', 0)}", rows["uid"].tolist()
+                st.dataframe(
+                    page_df.style.apply(lambda _: styles, subset=["Severity"]),
+                    height=SCROLLABLE_AREA_HEIGHT - 60, use_container_width=True, hide_index=True,
+                    on_select=lambda: pick_alert(key, uids), selection_mode="single-row", key=key,
+                )
+
+    # --- SEPARATOR 2 ---
+    with sep2:
+        st.markdown('<div class="vertical-line"></div>', unsafe_allow_html=True)
+
+    # --- CARD 6: PICTURE ---
+    with c3:
+        with st.container(border=True):
+            st.subheader("🖼️ Active Alert Picture")
+            st.caption("Details")
+
+            with st.container(height=SCROLLABLE_AREA_HEIGHT, border=False):
+                sel = get_selected_row()
+                if sel is None:
+                    st.info("Select an alert.")
+                else:
+                    cls, sev_txt, bg, col = severity_badge(sel[col_sev])
+                    ts_txt = sel["ts"].strftime("%d/%m/%Y %H:%M")
+                    conf = sel[col_conf]
+                    conf_txt = f"{conf:.0f}%" if pd.notna(conf) else "—"
+
                     st.markdown(f"""
-                    <div style="padding:12px; background:#f8fafc; border:1px solid #cbd5e1; border-radius:10px; margin-bottom:10px;">
-                        <div style="display:flex; justify-content:space-between; margin-bottom:4px;">
-                            <span style="font-weight:bold; font-size:15px; color:#0f172a !important;">{int(r[col_dogs])} Dog(s)</span>
-                            <span style="background:{bg}; color:{col} !important; padding:2px 8px; border-radius:4px; font-size:11px; font-weight:bold;">{sev_txt}</span>
-                        </div>
-                        <div style="display:flex; justify-content:space-between; align-items:center;">
-                            <span class="small-muted" style="font-size:12px;">{str(r[col_loc])}</span>
-                            <span class="small-muted" style="font-size:11px;">{time_ago(r["ts"], now)}</span>
-                        </div>
+                    <div style="margin-bottom:10px; display:flex; align-items:center; gap:10px;">
+                        <span style="font-size:18px; font-weight:900; color:#0f172a !important;">{str(sel[col_id])}</span>
+                        <span style="background:{bg}; color:{col} !important; padding:2px 8px; border-radius:4px; font-size:11px; font-weight:bold;">{sev_txt}</span>
                     </div>
                     """, unsafe_allow_html=True)
-                    
-                    if st.button(f"View {str(r[col_id])}", key=f"btn_{uid}"):
-                        st.session_state.selected_alert_uid = uid
 
-# --- SEPARATOR 2 ---
-with sep2:
-    st.markdown('<div class="vertical-line"></div>', unsafe_allow_html=True)
+                    img_ok = (col_img is not None) and str(sel.get(col_img, "")).startswith("http")
+                    if img_ok:
+                        st.image(snapshot_image(str(sel[col_img])), use_container_width=True)
+                    else:
+                        st.markdown("""<div class="thumb" style="height:220px;display:flex;align-items:center;justify-content:center;background:#f1f5f9;color:#64748b !important;font-weight:bold;">No Image</div>""", unsafe_allow_html=True)
+                
+                    st.markdown("---")
+                    st.markdown(f"**Loc:** {str(sel[col_loc])}")
+                    st.markdown(f"**Cam:** {str(sel[col_cam])}")
+                    st.markdown(f"**Time:** {ts_txt}")
+                    if not raw: st.markdown(f"**Seen:** until {sel['last_seen']:%H:%M:%S} · {int(sel['detections'])} detection{'s' if sel['detections'] != 1 else ''}")
+                    st.markdown(f"**Conf:** {conf_txt}")
+                    if sel["uid"] in surges: st.markdown(f"**Surge:** {surge_text(surges[sel['uid']])}")
 
-# --- CARD 6: PICTURE ---
-with c3:
-    with st.container(border=True):
-        st.subheader("🖼️ Active Alert Picture")
-        st.caption("Details")
+    lap("cards")
+    export_metrics()
 
-        with st.container(height=SCROLLABLE_AREA_HEIGHT, border=False):
-            sel = get_selected_row()
-            if sel is None:
-                st.info("Select an alert.")
-            else:
-                cls, sev_txt, bg, col = severity_badge(sel[col_sev])
-                ts_txt = sel["ts"].strftime("%d/%m/%Y %H:%M")
-                conf = sel[col_conf]
-                conf_txt = f"{conf:.0f}%" if pd.notna(conf) else "—"
-
-                st.markdown(f"""
-                <div style="margin-bottom:10px; display:flex; align-items:center; gap:10px;">
-                    <span style="font-size:18px; font-weight:900; color:#0f172a !important;">{str(sel[col_id])}</span>
-                    <span style="background:{bg}; color:{col} !important; padding:2px 8px; border-radius:4px; font-size:11px; font-weight:bold;">{sev_txt}</span>
-                </div>
-                """, unsafe_allow_html=True)
-
-                img_ok = (col_img is not None) and str(sel.get(col_img, "")).startswith("http")
-                if img_ok:
-                    st.image(str(sel[col_img]), use_container_width=True)
-                else:
-                    st.markdown("""<div class="thumb" style="height:220px;display:flex;align-items:center;justify-content:center;background:#f1f5f9;color:#64748b !important;font-weight:bold;">No Image</div>""", unsafe_allow_html=True)
-                
-                st.markdown("---")
-                st.markdown(f"**Loc:** {str(sel[col_loc])}")
-                st.markdown(f"**Cam:** {str(sel[col_cam])}")
-                st.markdown(f"**Time:** {ts_txt}")
-                st.markdown(f"**Conf:** {conf_txt}")
+live_panels()
 
 # =========================
 # SEPARATOR LINE UNDER ROW 2
@@ -489,82 +578,105 @@ st.markdown(
 # =========================
 # ROW 3: TRENDS & ANALYTICS
 # =========================
-with st.container(border=True):
-    st.subheader("📈 Detection Trends & Analytics")
-    mode = st.radio("Analytics View", ["24 Hours", "7 Days", "Severity Distribution"], horizontal=True)
-
-    if mode == "24 Hours":
-        start = now - timedelta(hours=24)
-        d = df_sorted[df_sorted["ts"] >= start].copy()
-        hourly = d.groupby("hour").agg(detections=(col_id, "count"), dogs=(col_dogs, "sum")).reset_index()
-        hours = list(range(24))
-        hourly = hourly.set_index("hour").reindex(hours, fill_value=0).reset_index()
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=hourly["hour"], y=hourly["detections"], mode="lines+markers", name="Detections"))
-        fig.add_trace(go.Scatter(x=hourly["hour"], y=hourly["dogs"], mode="lines+markers", name="Dogs"))
-        # Force Chart Text Color to Dark
-        fig.update_layout(template="plotly_white", margin=dict(l=10, r=10, t=10, b=10), height=300, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#000000'), xaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), yaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), legend=dict(font=dict(color='#000000')))
-        st.plotly_chart(fig, use_container_width=True, theme=None)
+@st.fragment(run_every=REFRESH_SEC)
+@METRICS.timed("page.analytics")
+def analytics_panel():
+    # reruns on its own against the newest snapshot (and keeps the 24h window moving); the
+    # figure is cached per data version and hour, so most ticks only resend it
+    snap = load_data(DATA_SOURCE)
+    if snap.data is None or len(snap.data) == 0: return
+    now = datetime.now(TZ)
 
-    elif mode == "7 Days":
-        start = now - timedelta(days=7)
-        d = df_sorted[df_sorted["ts"] >= start].copy()
-        d["day"] = d["ts"].dt.date
-        daily = d.groupby("day").agg(detections=(col_id, "count"), dogs=(col_dogs, "sum")).reset_index()
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=daily["day"].astype(str), y=daily["detections"], name="Detections"))
-        fig.add_trace(go.Bar(x=daily["day"].astype(str), y=daily["dogs"], name="Dogs"))
-        # Force Chart Text Color to Dark
-        fig.update_layout(template="plotly_white", barmode="group", margin=dict(l=10, r=10, t=10, b=10), height=300, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='#000000'), xaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), yaxis=dict(showgrid=True, gridcolor='#e2e8f0', color='#000000'), legend=dict(font=dict(color='#000000')))
+    with st.container(border=True):
+        st.subheader("📈 Detection Trends & Analytics")
+        mode = st.radio("Analytics View", ["24 Hours", "7 Days", "Severity Distribution"], horizontal=True)
+        scope = st.session_state.get("scope", "")
+        raw, roll = raw_view(snap), viewed(snap)[1]
+        fig = analytics_figure(mode, DATA_SOURCE, snap.version, now.replace(minute=0, second=0, microsecond=0), scope, raw, scoped(roll))
         st.plotly_chart(fig, use_container_width=True, theme=None)
 
-    else:
-        start = now - timedelta(days=7)
-        d = df_sorted[df_sorted["ts"] >= start].copy()
-        sev = d[col_sev].astype(str).str.upper().replace({"": "MEDIUM"}).fillna("MEDIUM")
-        counts = sev.value_counts().reindex(["CRITICAL", "HIGH", "MEDIUM", "LOW"]).fillna(0).astype(int)
-        fig = go.Figure(data=[go.Pie(labels=list(counts.index), values=list(counts.values), hole=0.6)])
-        # Force Chart Text Color to Dark
-        fig.update_layout(template="plotly_white", margin=dict(l=10, r=10, t=10, b=10), height=300, paper_bgcolor='rgba(0,0,0,0)', font=dict(color='#000000'), legend=dict(font=dict(color='#000000')))
-        st.plotly_chart(fig, use_container_width=True, theme=None)
+analytics_panel()
 
 st.markdown('<div style="height:20px;"></div>', unsafe_allow_html=True)
 
 # =========================
 # ROW 4: RECENT EVENTS (FORCED LIGHT TABLE)
 # =========================
-with st.container(border=True):
-    st.subheader("🧾 Recent Detection Events")
-    st.caption("Last 50 records (scrollable)")
-    recent = df_sorted.head(50).copy()
-    show = recent[[col_id, col_dogs, col_conf, col_sev, col_status]].copy()
-    show.insert(0, "Timestamp", recent["ts"].dt.strftime("%b %d, %I:%M %p"))
-    show.columns = ["Timestamp", "Detection ID", "Stray Dogs", "Confidence", "Severity", "Status"]
-    show["Confidence"] = np.where(pd.notna(recent[col_conf]), recent[col_conf].round(0).astype(int).astype(str) + "%", "—")
-    
-    # 1. Force Pandas Styler (Black Text)
-    def highlight_sev(val):
-        return 'color: #000000 !important;' 
-    
-    styled_df = show.style.set_properties(**{
-        'background-color': '#ffffff', 
-        'color': '#000000 !important', 
-        'border-color': '#e2e8f0'
-    }).map(highlight_sev, subset=['Severity']).set_table_styles([
-        # Headers: Grey Cair (#f8fafc) & Black Bold Text
-        {'selector': 'th', 'props': [('background-color', '#f8fafc'), ('color', '#000000 !important'), ('font-weight', '900'), ('border-bottom', '2px solid #9e5908')]},
-        # Rows: White BG & Black Text
-        {'selector': 'td', 'props': [('color', '#000000 !important'), ('background-color', '#ffffff !important')]}
-    ])
-
-    # 2. Render Dataframe with hide_index=True
-    st.dataframe(
-        styled_df, 
-        use_container_width=True, 
-        height=380, 
-        hide_index=True,
-        column_config={
-            "Timestamp": st.column_config.TextColumn("Timestamp", width="medium"), 
-            "Detection ID": st.column_config.TextColumn("ID", width="small")
-        }
-    )
+@st.fragment(run_every=REFRESH_SEC)
+@METRICS.timed("page.recent_events")
+def recent_events():
+    # reruns on its own against the newest snapshot; picking a date range reruns only this panel
+    snap = load_data(DATA_SOURCE)
+    if snap.data is None or len(snap.data) == 0: return
+    data, raw = viewed(snap)[0], raw_view(snap)
+    today = datetime.now(TZ).date()
+    scope = st.session_state.get("scope", "")
+    data = scoped(data)
+    col_ts, col_id, col_loc, col_cam, col_camtype, col_dogs, col_conf, col_sev, col_status, col_img = column_names(data)
+    with st.container(border=True):
+        st.subheader("🧾 Recent Detection Events")
+        if len(data) == 0:
+            st.info("No detections for this camera.")
+            return
+        first_day, last_day = data.date_span()
+        f1, f2, f3, f4, f5 = st.columns([2, 1.4, 1.4, 0.9, 1.6])
+        with f1: picked = st.date_input("Date range", value=(first_day, max(last_day, today)), min_value=first_day, format="DD/MM/YYYY")
+        with f2: severities = st.multiselect("Severity", list(data.df[col_sev].cat.categories), placeholder="All")
+        with f3: statuses = st.multiselect("Status", list(data.df[col_status].cat.categories), placeholder="All")
+        with f4: min_dogs = st.number_input("Min dogs", min_value=0, value=0, step=1)
+        with f5: conf = st.slider("Confidence %", 0, 100, (0, 100))
+        # a half-picked range (start only) shows that single day
+        range_start, range_end = (tuple(picked) + tuple(picked))[:2] if picked else (first_day, today)
+        filters = dict(severities=severities, statuses=statuses, min_dogs=min_dogs, conf=None if conf == (0, 100) else conf)
+
+        # back to the newest page whenever the query changes
+        query = (scope, range_start, range_end, tuple(severities), tuple(statuses), min_dogs, conf)
+        if st.session_state.get("events_query") != query: st.session_state.events_query, st.session_state.events_page = query, 0
+        page = st.session_state.events_page
+        # one extra row tells whether an older page exists, so no count over the range is needed
+        start, end = range_start, range_end + timedelta(days=1)
+        if scope or not raw: recent = data.events(start, end, **filters).iloc[page * EVENTS_PAGE:(page + 1) * EVENTS_PAGE + 1]
+        else: recent = recent_rows(sheet_poller(DATA_SOURCE), data, start, end, EVENTS_PAGE + 1, page * EVENTS_PAGE, **filters)
+        more, recent = len(recent) > EVENTS_PAGE, recent.head(EVENTS_PAGE)
+
+        show = pd.DataFrame({
+            "Timestamp": recent["ts"].dt.strftime("%b %d, %I:%M %p"),
+            "Detection ID": recent[col_id],
+            "Stray Dogs": recent[col_dogs],
+            "Confidence": recent[col_conf],
+            "Severity": recent[col_sev],
+            "Status": recent[col_status],
+        })
+        if not raw: show["Last Seen"], show["Detections"] = recent["last_seen"].dt.strftime("%I:%M:%S %p").to_numpy(), recent["detections"].to_numpy()
+        # column_config formats on the client: render cost no longer grows with per-cell styling
+        st.dataframe(
+            show,
+            use_container_width=True,
+            height=380,
+            hide_index=True,
+            column_config={
+                "Timestamp": st.column_config.TextColumn("Timestamp", width="medium"),
+                "Detection ID": st.column_config.TextColumn("ID", width="small"),
+                "Stray Dogs": st.column_config.NumberColumn("Stray Dogs", format="%d"),
+                "Confidence": st.column_config.NumberColumn("Confidence", format="%.0f%%"),
+            }
+        )
+        p1, p2, p3 = st.columns([1, 4, 1])
+        def turn(step): st.session_state.events_page = max(0, st.session_state.events_page + step)
+        p1.button("◀ Newer", on_click=turn, args=(-1,), disabled=page == 0, use_container_width=True)
+        p2.caption(f"Page {page + 1} · records {page * EVENTS_PAGE + 1 if len(recent) else 0}–{page * EVENTS_PAGE + len(recent)} in range, newest first")
+        p3.button("Older ▶", on_click=turn, args=(1,), disabled=not more, use_container_width=True)
+
+recent_events()
+
+# =========================
+# ADMIN: STAGE TIMINGS
+# =========================
+if ADMIN_KEY and st.query_params.get("admin") == ADMIN_KEY:
+    with st.sidebar:
+        st.subheader("⏱️ Stage timings")
+        st.dataframe(METRICS.summary(), hide_index=True, use_container_width=True)
+        rec = METRICS.record()
+        st.dataframe(pd.Series({**rec["counters"], **rec["gauges"]}, name="value"), use_container_width=True)
+        st.download_button("Download Prometheus metrics", METRICS.prometheus(), "dashboard.prom", "text/plain")
+export_metrics()
@@ -0,0 +1,87 @@
+"""Local stand-in for the published Google Sheet CSV.
+
+    python fake_sheet.py detections.csv --port 8765
+    SHEET_CSV_URL=http://127.0.0.1:8765/ streamlit run dashboard.py
+
+The file is re-read on every request, so appending rows to it simulates the
+detector writing to the sheet. ``Range: bytes=N-`` and ``If-None-Match``
+requests are honoured, and every response carries ETag / Last-Modified.
+
+Given a directory instead, it serves the files in it by request path, which
+stands in for the snapshot image host:
+
+    python fake_sheet.py snapshots/ --port 8766
+"""
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(path):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            target = path
+            if os.path.isdir(path):
+                target = os.path.join(path, os.path.normpath(self.path.split("?")[0]).lstrip("/\\"))
+                if not os.path.realpath(target).startswith(os.path.realpath(path) + os.sep) or not os.path.isfile(target):
+                    self.send_error(404)
+                    return
+            self.server.hits += 1
+            with open(target, "rb") as f:
+                body = f.read()
+                mtime = os.fstat(f.fileno()).st_mtime
+            etag = f'"{len(body)}-{hashlib.sha1(body).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            m = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", "").strip())
+            if m:
+                start = int(m.group(1))
+                if start >= len(body) and len(body) > 0:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(body)}")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                body = body[start:]
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", mimetypes.guess_type(target)[0] or "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    return Handler
+
+
+def serve(path, host="127.0.0.1", port=0, background=True):
+    """Start the server and return it; ``server.server_address`` holds the bound port
+    and ``server.hits`` counts the requests that read the file."""
+    server = ThreadingHTTPServer((host, port), make_handler(path))
+    server.hits = 0
+    if background: threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("csv", help="CSV file, or a directory of files to serve")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    a = ap.parse_args()
+    srv = serve(a.csv, a.host, a.port, background=False)
+    print(f"serving {a.csv} on http://{a.host}:{a.port}/")
+    srv.serve_forever()
@@ -0,0 +1,123 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from PIL import Image, ImageOps
+
+log = logging.getLogger(__name__)
+
+# =========================
+# SNAPSHOT IMAGE CACHE
+# =========================
+# Snapshot URLs are fetched once per process and kept on disk, together with a
+# downsized JPEG for the 220px camera card. The dashboard hands the bytes to
+# st.image, which serves them from Streamlit's media endpoint (content-hashed
+# URLs the browser can cache), so viewers no longer hit the snapshot host on
+# every refresh. Files are evicted least-recently-used once the cache exceeds
+# ``max_bytes`` (access time is tracked through the file mtime).
+
+THUMB_SIZE = (640, 320)  # 2x the .thumb card height, cropped like object-fit: cover
+FAIL_RETRY_SEC = 60      # don't refetch a broken URL on every rerun
+
+
+class ImageCache:
+    def __init__(self, root, max_bytes=256 * 1024 * 1024, timeout=10):
+        self.root, self.max_bytes, self.timeout = root, max_bytes, timeout
+        self.lock = threading.Lock()
+        self.key_locks = {}  # path -> [lock, threads using it], only while a fetch is in flight
+        self.failed = {}     # url -> time of the last failed fetch, dropped once retried
+        self.hits = self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self.size = sum(e.stat().st_size for e in os.scandir(root) if e.is_file())
+
+    def _path(self, url, kind):
+        return os.path.join(self.root, hashlib.sha1(url.encode()).hexdigest() + kind)
+
+    @contextmanager
+    def _key_lock(self, path):
+        with self.lock:
+            entry = self.key_locks.setdefault(path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]: yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]: del self.key_locks[path]
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f: body = f.read()
+        except OSError: return None
+        try: os.utime(path)  # mark as recently used
+        except OSError: pass
+        return body
+
+    def _store(self, path, body):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f: f.write(body)
+        old = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+        with self.lock: self.size += len(body) - old
+        if self.size > self.max_bytes: self.evict()
+
+    def evict(self):
+        with self.lock:
+            files = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.root) if e.is_file())
+            for _, size, path in files:
+                if self.size <= self.max_bytes * 0.9: break
+                try: os.remove(path)
+                except OSError: continue
+                self.size -= size
+
+    def _cached(self, path, make):
+        body = self._read(path)
+        if body is not None:
+            self.hits += 1
+            return body
+        with self._key_lock(path):  # one fetch per URL even with many sessions asking at once
+            body = self._read(path)
+            if body is not None: return body
+            self.misses += 1
+            body = make()
+            if body is not None: self._store(path, body)
+            return body
+
+    def _fetch(self, url):
+        with self.lock:
+            if time.time() - self.failed.get(url, 0) < FAIL_RETRY_SEC: return None
+            self.failed.pop(url, None)
+        try:
+            req = urllib.request.Request(url, headers={"User-Agent": "dashboard-image-cache"})
+            with urllib.request.urlopen(req, timeout=self.timeout) as r: return r.read()
+        except Exception as e:
+            log.warning("could not fetch snapshot %s: %s", url, e)
+            with self.lock:
+                now = time.time()
+                self.failed = {u: t for u, t in self.failed.items() if now - t < FAIL_RETRY_SEC}
+                self.failed[url] = now
+            return None
+
+    def get(self, url):
+        """Original image bytes, or None if the URL can't be fetched."""
+        return self._cached(self._path(url, ".img"), lambda: self._fetch(url))
+
+    def thumb(self, url, size=THUMB_SIZE):
+        """Downsized JPEG for the card, or None if the URL can't be fetched or decoded."""
+        def make():
+            body = self.get(url)
+            if body is None: return None
+            try:
+                with Image.open(io.BytesIO(body)) as im:
+                    out = io.BytesIO()
+                    ImageOps.fit(ImageOps.exif_transpose(im).convert("RGB"), size).save(out, "JPEG", quality=80, optimize=True)
+                    return out.getvalue()
+            except Exception as e:
+                log.warning("could not decode snapshot %s: %s", url, e)
+                return None
+        return self._cached(self._path(url, f".{size[0]}x{size[1]}.jpg"), make)
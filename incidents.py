@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from pipeline import Dataset
+
+# =========================
+# INCIDENTS
+# =========================
+# A camera that keeps seeing the same dogs logs a near-identical row every few
+# seconds, which inflates every count. Detections of one camera less than
+# ``gap`` apart are merged into one incident: first seen (its ``ts``), last seen,
+# the most dogs and the highest confidence of any of its detections, and the
+# detection with the most dogs as its representative (snapshot, id, severity,
+# status). An incident keeps the uid of its first detection, so a selection
+# survives the incident growing. Incidents are laid out like prepared rows, so
+# Dataset and Rollups work on them unchanged.
+
+INCIDENT_GAP_SEC = 120
+
+
+def coalesce(df, cols, gap_sec=INCIDENT_GAP_SEC) -> pd.DataFrame:
+    """Incidents of a prepared frame, newest first, with ``last_seen`` and ``detections`` columns added."""
+    if len(df) == 0: return df.assign(last_seen=df["ts"], detections=np.zeros(0, dtype=np.int32))
+    ns = df["ts"].to_numpy("M8[ns]").astype(np.int64)
+    cam = df[cols["cam"]].cat.codes.to_numpy()
+    dogs = df[cols["dogs"]].to_numpy()
+    conf = df[cols["conf"]].to_numpy()
+    # one sweep over each camera's timestamps: an incident starts wherever the camera
+    # changes or the time since its previous detection is more than the gap
+    order = np.lexsort((ns, cam))
+    t, c = ns[order], cam[order]
+    starts = np.flatnonzero(np.r_[True, (c[1:] != c[:-1]) | (np.diff(t) > gap_sec * 10**9)])
+    ends = np.r_[starts[1:], len(order)]
+    group = np.repeat(np.arange(len(starts)), ends - starts)
+    # representative: most dogs, then highest confidence, then latest -- the last row of each group in this order
+    best = np.lexsort((t, np.nan_to_num(conf[order], nan=-1.0), dogs[order], group))
+    rep = order[best[ends - 1]]
+
+    out = df.iloc[rep].reset_index(drop=True)
+    # take on the arrays themselves: tz-aware timestamps would round-trip through objects otherwise
+    out["ts"] = df["ts"].array.take(order[starts])
+    out["hour"] = out["ts"].dt.hour.astype(np.int8)
+    out["uid"] = df["uid"].array.take(order[starts])
+    out[cols["conf"]] = np.fmax.reduceat(conf[order], starts)
+    out["last_seen"] = df["ts"].array.take(order[ends - 1])
+    out["detections"] = (ends - starts).astype(np.int32)
+    return out.sort_values("ts", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def incidents(data: Dataset, gap_sec=INCIDENT_GAP_SEC) -> Dataset:
+    return Dataset(coalesce(data.df, data.cols, gap_sec), data.cols, data.digest)
+
+
+def reopened(inc: Dataset, since, gap_sec=INCIDENT_GAP_SEC) -> pd.Timestamp:
+    """Earliest start of an incident that detections from ``since`` on could extend.
+
+    Every incident starting after that is rebuilt; the ones before it ended more than
+    ``gap_sec`` before any incident that is, so they are final.
+    """
+    if len(inc) == 0: return since
+    gap_ns = gap_sec * 10**9
+    last = inc.df["last_seen"].to_numpy("M8[ns]").astype(np.int64)
+    while True:
+        lo, _ = inc.bounds(None, since)  # rows lo: started before ``since``
+        still_open = np.flatnonzero(last[lo:] >= since.value - gap_ns)
+        if len(still_open) == 0: return since
+        since = inc.df["ts"].iat[lo + still_open[-1]]  # newest first: the last hit started earliest
+
+
+def update(inc: Dataset, data: Dataset, new: Dataset, gap_sec=INCIDENT_GAP_SEC):
+    """Fold ``new`` (rows just merged into ``data``) into ``inc``.
+
+    Returns the new incidents plus the incident rows taken out and put in, so
+    their Rollups can be updated with the same two frames.
+    """
+    if len(new) == 0: return inc, inc.df.iloc[:0], inc.df.iloc[:0]
+    since = reopened(inc, new.df["ts"].iat[-1], gap_sec)
+    lo, _ = inc.bounds(None, since)
+    added = coalesce(data.window(since), data.cols, gap_sec)
+    return inc.before(since).extend(Dataset(added, data.cols, data.digest), data.digest), inc.df.iloc[:lo], added
+
+
+def incident_of(inc: Dataset, cam, ts):
+    """uid of the incident of camera ``cam`` that the detection at ``ts`` belongs to, or None."""
+    part = inc.part("cam", cam)
+    lo, _ = part.bounds(None, ts + pd.Timedelta(1, "ns"))  # the newest incident started by ``ts``
+    if lo == len(part) or part.df["last_seen"].iat[lo] < ts: return None
+    return part.df["uid"].iat[lo]
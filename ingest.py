@@ -0,0 +1,317 @@
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+import warnings
+from typing import NamedTuple
+from urllib.error import HTTPError
+
+import pandas as pd
+
+from metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+# =========================
+# INCREMENTAL CSV INGESTION
+# =========================
+# The published sheet only ever grows at the bottom, so instead of re-parsing the
+# whole document on every refresh we remember how many bytes were already parsed
+# and only hand the new lines to pandas. Any change to the already-parsed part
+# (edited cell, deleted row, new column) triggers a full resync.
+
+CHECK_BYTES = 4096  # bytes re-read before the offset to detect edits on ranged reads
+SKIPPED_LINE = re.compile(r"Skipping line (\d+): (.*)")
+
+
+def clean_cols(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return df
+
+
+def skipped_lines(caught) -> list:
+    """``(line number, reason)`` for every row the C parser dropped, from its recorded ParserWarnings."""
+    return [(int(m[1]), m[2]) for w in caught if issubclass(w.category, pd.errors.ParserWarning)
+            for m in SKIPPED_LINE.finditer(str(w.message))]
+
+
+def read_csv_checked(buf, **kw):
+    """``read_csv(dtype=str)`` with the C parser; rows with too many fields are skipped (as with
+    ``on_bad_lines="skip"``) but reported. Returns ``(df, skipped_lines)``.
+
+    With ``chunksize`` the reader is lazy, so callers record warnings around each chunk themselves.
+    """
+    # catch_warnings swaps process-wide state; only the poller thread (or a backfill) parses
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        df = pd.read_csv(buf, dtype=str, engine="c", on_bad_lines="warn", **kw)
+    return df, skipped_lines(caught)
+
+
+def parse_csv_bytes(data: bytes) -> pd.DataFrame:
+    df, skipped = read_csv_checked(io.BytesIO(data))
+    if skipped:
+        METRICS.inc("lines_skipped", len(skipped))
+        log.warning("skipped %d malformed line(s), first at line %d of the batch: %s", len(skipped), *skipped[0])
+    return clean_cols(df)
+
+
+def is_url(source) -> bool:
+    return str(source).startswith(("http://", "https://"))
+
+
+class IncrementalCsv:
+    def __init__(self, source, timeout=15, verify_sec=300, keep_frame=True):
+        self.source = source
+        self.timeout = timeout
+        self.verify_sec = verify_sec  # force a full read (prefix check, no re-parse) this often
+        self.keep_frame = keep_frame  # False when a consumer keeps its own copy of the rows (deltas only)
+        self.lock = threading.Lock()
+        self.resyncs = 0
+        self.version = 0
+        self.bytes_fetched = 0
+        self._reset()
+
+    def _reset(self):
+        self.frame = pd.DataFrame()
+        self.header = b""
+        self.offset = 0        # bytes consumed so far (always ends on a line break)
+        self.tail = b""        # last CHECK_BYTES consumed, compared on ranged reads
+        self.sha = hashlib.sha1()
+        self.digest = ""
+        self.fetched_at = 0.0
+        self.verified_at = 0.0
+        self.validators = None  # (ETag, Last-Modified) for URLs, (size, mtime) for files
+        self.last_delta = self.frame
+        self.resynced = False
+
+    # ---- reading ----
+    @METRICS.timed("ingest.fetch")
+    def _read(self, start):
+        if is_url(self.source): return self._read_url(start)
+        return self._read_file(start)
+
+    # a body of None means "not modified since the last read"
+    def _read_file(self, start):
+        with open(self.source, "rb") as f:
+            st_ = os.fstat(f.fileno())
+            validators = (st_.st_size, st_.st_mtime_ns)
+            # unchanged since the last read: done writing, so an unterminated last line is complete
+            done = validators == self.validators
+            if done and st_.st_size <= self.offset: return None, start, False
+            self.validators = validators
+            if start > st_.st_size: start = 0
+            f.seek(start)
+            return f.read(), start, done
+
+    def _read_url(self, start):
+        req = urllib.request.Request(self.source)
+        if start: req.add_header("Range", f"bytes={start}-")
+        etag, modified = self.validators or (None, None)
+        if etag: req.add_header("If-None-Match", etag)
+        if modified: req.add_header("If-Modified-Since", modified)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                body = resp.read()
+                if resp.status != 206: start = 0
+                self.validators = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        except HTTPError as e:
+            if e.code == 304: return None, start, True
+            if e.code != 416 or not start: raise
+            self.validators = None
+            return self._read_url(0)
+        return body, start, True
+
+    # ---- ingestion ----
+    def refresh(self, max_age=0):
+        """Fetch new bytes and parse only the rows after the last offset.
+
+        Returns the DataFrame of newly added rows, or ``None`` when nothing changed.
+        After a resync (``resynced`` is set) the returned frame holds every row.
+        With ``keep_frame`` the rows are also accumulated in ``frame``.
+        """
+        with self.lock:
+            now_ = time.time()
+            if self.fetched_at and now_ - self.fetched_at < max_age: return None
+            self.fetched_at = now_
+            verify = self.offset == 0 or self.sha is None or now_ - self.verified_at >= self.verify_sec
+            start = 0 if verify else max(0, self.offset - len(self.tail))
+            body, start, atomic = self._read(start)
+            if body is None: return None
+            self.bytes_fetched += len(body)
+            if start == 0: self.verified_at = now_
+
+            if not self._prefix_matches(body, start) or self._last_line_grew(body, start):
+                self.resyncs += 1
+                self._reset()
+                self.fetched_at = self.verified_at = now_
+                if start != 0:
+                    body, start, atomic = self._read(0)
+                    self.bytes_fetched += len(body)
+                new = body
+            else:
+                new = body[self.offset - start:]
+
+            # a local file may be mid-write: keep an unterminated last line until a read finds the file unchanged
+            if not atomic:
+                cut = new.rfind(b"\n")
+                new = new[:cut + 1] if cut >= 0 else b""
+            if not new.strip(): return None
+            return self._consume(new)
+
+    def _prefix_matches(self, body, start):
+        if self.offset == 0: return True
+        if start == 0:
+            if len(body) < self.offset: return False
+            sha = hashlib.sha1(memoryview(body)[:self.offset])
+            if sha.hexdigest() != self.digest: return False
+            if self.sha is None: self.sha = sha  # restored from a checkpoint: resume hashing from here
+            return True
+        return body[:len(self.tail)] == self.tail
+
+    def _last_line_grew(self, body, start):
+        # an atomic document may end without a line break; bytes appended straight
+        # after it mean the last row was edited rather than a new row added
+        if not self.tail or self.tail.endswith(b"\n"): return False
+        nxt = body[self.offset - start:self.offset - start + 1]
+        return nxt not in (b"", b"\r", b"\n")
+
+    def _parse(self, new) -> pd.DataFrame:
+        if self.offset == 0:
+            nl = new.find(b"\n")
+            self.header = new[:nl + 1] if nl >= 0 else new + b"\n"
+            return parse_csv_bytes(self.header + (new[nl + 1:] if nl >= 0 else b""))
+        return parse_csv_bytes(self.header + new)
+
+    @METRICS.timed("ingest.parse")
+    def _consume(self, new):
+        self.resynced = self.offset == 0
+        delta = self._parse(new)
+        if self.resynced:
+            if self.keep_frame: self.frame = delta
+        elif self.keep_frame and len(delta):
+            self.frame = pd.concat([self.frame, delta], ignore_index=True)
+
+        self.offset += len(new)
+        self.tail = (self.tail + new)[-CHECK_BYTES:]
+        self.sha.update(new)
+        self.digest = self.sha.hexdigest()
+        self.version += 1
+        self.last_delta = delta
+        return delta
+
+    # ---- warm start ----
+    def checkpoint(self) -> dict:
+        with self.lock:
+            return {
+                "source": str(self.source), "offset": self.offset, "digest": self.digest,
+                "header": base64.b64encode(self.header).decode(), "tail": base64.b64encode(self.tail).decode(),
+                "version": self.version, "resyncs": self.resyncs,
+            }
+
+    def restore(self, cp: dict):
+        """Resume after rows up to ``cp["offset"]`` were loaded from elsewhere; ``frame`` starts empty.
+
+        The next refresh does a full read to check the prefix against the saved digest
+        (resyncing if the sheet changed meanwhile) and then only parses what follows.
+        """
+        with self.lock:
+            self._reset()
+            self.header = base64.b64decode(cp["header"])
+            self.tail = base64.b64decode(cp["tail"])
+            self.offset, self.digest = cp["offset"], cp["digest"]
+            self.version, self.resyncs = cp["version"], cp["resyncs"]
+            self.sha = None
+
+
+# =========================
+# SHARED POLLER
+# =========================
+# One background thread per process owns fetching and publishes immutable
+# snapshots; sessions only read ``poller.snapshot`` and rerun when its version moves.
+
+class Snapshot(NamedTuple):
+    version: int
+    frame: pd.DataFrame  # shared between sessions: never mutate in place
+    digest: str
+    fetched_at: float
+    epoch: int = 0  # bumped on every full resync; same epoch means frame only grew
+    data: object = None     # derived state filled in by the poller's ``derive`` hook
+    rollups: object = None
+    escalations: object = None
+    incidents: object = None        # ``data`` / ``rollups`` with repeated detections merged (see incidents.py)
+    incident_rollups: object = None
+
+
+class Poller:
+    """``derive(previous_snapshot, delta, resynced, snapshot)`` may return extra Snapshot
+    fields computed from the new rows; it runs on the poller thread, once per version."""
+
+    def __init__(self, source: IncrementalCsv, interval: float, derive=None, snapshot=None):
+        self.source = source
+        self.interval = interval
+        self.derive = derive
+        self.restored = snapshot is not None
+        self.snapshot = snapshot or Snapshot(0, pd.DataFrame(), "", 0.0)
+        self.error = None
+        self.changed = threading.Condition()
+        self._stop = threading.Event()
+        self._wake = getattr(source, "arrived", None) or threading.Event()  # push sources poll as soon as rows arrive
+        self._thread = None
+
+    def start(self):
+        # first fetch runs in the caller so errors surface and the first paint has data;
+        # with a snapshot restored from the cache, a failure is only reported like later ones
+        try: self.poll_once()
+        except Exception as e:
+            if not self.restored: raise
+            log.warning("serving the cached snapshot, first refresh of %s failed: %s", self.source.source, e)
+            self.error = e
+            METRICS.inc("poll_errors")
+        self._thread = threading.Thread(target=self._run, name=f"poller:{self.source.source}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread: self._thread.join(timeout=self.interval + self.source.timeout)
+
+    def poll_once(self):
+        delta = self.source.refresh()
+        src = self.source
+        METRICS.inc("polls")
+        METRICS.set("bytes_fetched", src.bytes_fetched)
+        if delta is None and self.snapshot.version: return False
+        METRICS.inc("rows_ingested", 0 if delta is None else len(delta))
+        with src.lock: snap = Snapshot(src.version, src.frame, src.digest, src.fetched_at, src.resyncs)
+        if self.derive: snap = snap._replace(**self.derive(self.snapshot, delta, src.resynced, snap))
+        with self.changed:
+            self.snapshot = snap
+            self.changed.notify_all()
+        METRICS.set("data_version", snap.version)
+        METRICS.set("resyncs", snap.epoch)
+        return True
+
+    def wait_for_change(self, version, timeout=None):
+        with self.changed:
+            self.changed.wait_for(lambda: self.snapshot.version != version, timeout)
+        return self.snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set(): break
+            try:
+                self.poll_once()
+                self.error = None
+            except Exception as e:  # keep serving the last good snapshot
+                self.error = e
+                METRICS.inc("poll_errors")
@@ -0,0 +1,155 @@
+import logging
+
+import pandas as pd
+
+import store
+from anomaly import SurgeDetector
+from incidents import INCIDENT_GAP_SEC, incidents, reopened, update
+from metrics import METRICS
+from ingest import IncrementalCsv, Poller, Snapshot
+from pipeline import Dataset, prepare, resolve_columns
+from rollups import Rollups
+from sources import open_source
+
+log = logging.getLogger(__name__)
+
+# =========================
+# LIVE DATA PIPELINE
+# =========================
+# Runs on the shared poller thread: every batch of new sheet rows is prepared
+# once, merged into the previous Dataset and Rollups, and (optionally) written
+# to the local columnar cache. Sessions only ever read the published Snapshot.
+# With ``hot_days`` set, raw rows older than that many days before the newest
+# detection are dropped and only their compacted rollups are kept, so memory
+# stays flat however long the sheet grows. Compacted history from before the
+# source's first row (backfills, rows since deleted from the sheet) survives resyncs.
+# New rows also feed the surge detector (see anomaly.py), which only ever looks at
+# each detection once; it replays the retained rows after a restart or resync.
+# Alongside the rows the pipeline keeps their incidents (repeated detections of
+# one camera merged, see incidents.py) with their own Rollups; only the incidents
+# new rows can still extend are rebuilt per batch. Retention keeps the raw rows of
+# incidents still open at the cutoff (their counts are already compacted), so a
+# rebuild never turns the tail of a compacted incident into a new one.
+
+DERIVED = ("data", "rollups", "escalations", "incidents", "incident_rollups")
+
+
+class LivePipeline:
+    def __init__(self, source: IncrementalCsv, cache_dir=None, hot_days=None, incident_gap=INCIDENT_GAP_SEC):
+        self.source = source
+        self.cache_dir = cache_dir
+        self.hot_days = hot_days
+        self.incident_gap = incident_gap
+        self.surges = SurgeDetector()
+
+    def warm_start(self):
+        """Snapshot restored from the local cache, or None for a cold start."""
+        if not self.cache_dir: return None
+        try: loaded = store.load(self.cache_dir, self.source.source)
+        except Exception:
+            log.exception("ignoring unreadable cache in %s", self.cache_dir)
+            return None
+        archive = store.load_archive(self.cache_dir, self.source.source)
+        inc_archive = store.load_archive(self.cache_dir, self.source.source, store.INCIDENT_ARCHIVE)
+        if loaded is None:  # nothing to resume from, but the first (full) read keeps backfilled history
+            return None if archive is None else Snapshot(0, pd.DataFrame(), "", 0.0, rollups=archive, incident_rollups=inc_archive)
+        data, cp = loaded
+        self.source.restore(cp)
+        rollups = inc_rollups = Rollups()
+        inc = incidents(data, self.incident_gap)
+        if archive is not None:  # days already compacted may still have partitions if we stopped mid-save
+            keep = reopened(inc, archive.compacted, self.incident_gap)
+            data, rollups, inc = data.trim(keep), archive, inc.trim(keep)
+            # days compacted before incidents were counted have no incident history
+            inc_rollups = Rollups(compacted=archive.compacted) if inc_archive is None else inc_archive
+        self.surges.replay(data)
+        src = self.source
+        return Snapshot(src.version, src.frame, src.digest, 0.0, src.resyncs, data, rollups.merge(Rollups().add(data.window(rollups.compacted), data.cols)),
+                        self.surges.escalations, inc, inc_rollups.merge(Rollups().add(inc.window(inc_rollups.compacted), inc.cols)))
+
+    def __call__(self, prev, delta, resynced, snap):
+        if delta is None: return {k: getattr(prev, k) for k in DERIVED}
+        base = None if resynced else prev.data
+        with METRICS.timer("pipeline.prepare"):
+            new = prepare(delta, snap.digest, id_offset=base.dropped + len(base) if base is not None else 0)
+        if new is None:  # no timestamp column in these rows
+            if base is not None:  # a bad batch (push, JSONL line) appended to good rows: keep what we have
+                METRICS.inc("batches_skipped")
+                log.warning("skipped %d row(s) without a timestamp from %s", len(delta), self.source.source)
+                return {k: getattr(prev, k) for k in DERIVED}
+            return dict.fromkeys(DERIVED) | {"rollups": Rollups(), "incident_rollups": Rollups()}
+        with METRICS.timer("pipeline.merge"):
+            if base is None:
+                data, rollups = new, self._history(prev.rollups, new).merge(Rollups().add(new.df, new.cols))
+            else:
+                data, rollups = base.extend(new, snap.digest), prev.rollups.add(new.df, new.cols)
+        with METRICS.timer("pipeline.incidents"):
+            if base is None:
+                inc = incidents(data, self.incident_gap)
+                inc_rollups = self._history(prev.incident_rollups, new).merge(Rollups().add(inc.df, inc.cols))
+            else:
+                inc, out, added = update(prev.incidents, data, new, self.incident_gap)
+                inc_rollups = prev.incident_rollups.add(out, inc.cols, sign=-1).add(added, inc.cols)
+        with METRICS.timer("pipeline.surges"):
+            METRICS.inc("escalations", self.surges.replay(new) if base is None else self.surges.feed(new.df, new.cols))
+        cutoff = self._cutoff(data, rollups) if self.hot_days and len(data) else None
+        if cutoff is not None:
+            # once a day (when the cutoff moves): fold old hour buckets into days and drop old raw rows,
+            # except those of incidents that rows after the cutoff still reach
+            with METRICS.timer("pipeline.retention"):
+                keep = reopened(inc, cutoff, self.incident_gap)
+                data, rollups = data.trim(keep), rollups.compact(cutoff)
+                inc, inc_rollups = inc.trim(keep), inc_rollups.compact(cutoff)
+        METRICS.set("rows", len(data))
+        METRICS.set("incidents", len(inc))
+        if self.cache_dir:
+            with METRICS.timer("pipeline.persist"):
+                self._persist(data, new, resynced or cutoff is not None, *((rollups, inc_rollups) if cutoff is not None else ()))
+        return {"data": data, "rollups": rollups, "escalations": self.surges.escalations, "incidents": inc, "incident_rollups": inc_rollups}
+
+    def _history(self, rollups, new):
+        # compacted days older than anything the source now holds; the rest is recounted from ``new``
+        if rollups is None or rollups.compacted is None: return Rollups()
+        return rollups.before(min(rollups.compacted, new.df["ts"].iat[-1].normalize()))
+
+    def _cutoff(self, data, rollups):
+        # the new retention cutoff, or None while it has not moved
+        cutoff = data.df["ts"].iat[0].normalize() - pd.Timedelta(days=self.hot_days)
+        return None if rollups.compacted is not None and rollups.compacted >= cutoff else cutoff
+
+    def _persist(self, data, new, rewrite, rollups=None, inc_rollups=None):
+        days = None if rewrite else sorted({str(t.date()) for t in new.df["ts"].dt.normalize().unique()})
+        try:
+            # archives first: after a crash between the writes warm_start trims the extra days
+            # (and counts incidents from the incident archive's own cutoff)
+            if inc_rollups is not None:
+                store.save_archive(self.cache_dir, inc_rollups.before(inc_rollups.compacted), self.source.source, store.INCIDENT_ARCHIVE)
+            if rollups is not None: store.save_archive(self.cache_dir, rollups.before(rollups.compacted), self.source.source)
+            store.save(self.cache_dir, data, self.source.checkpoint(), days)
+        except Exception: log.exception("could not update cache in %s", self.cache_dir)
+
+
+def start_poller(url, interval, cache_dir=None, hot_days=None, incident_gap=INCIDENT_GAP_SEC) -> Poller:
+    src = open_source(url, keep_frame=False)
+    pipeline = LivePipeline(src, cache_dir, hot_days, incident_gap)
+    return Poller(src, interval, derive=pipeline, snapshot=pipeline.warm_start()).start()
+
+
+def recent(poller: Poller, data: Dataset, start, end, limit=50, offset=0, **filters):
+    """Prepared rows with start <= ts < end matching ``filters`` (see ``Dataset.events``),
+    newest first, ``limit`` rows from position ``offset``.
+
+    Unfiltered pages are queried at the source when it can; filtered ones, sources
+    without range queries and rows without a detection id (generated ids would not
+    match the snapshot's) use the in-memory frame.
+    """
+    window = getattr(poller.source, "window", None)
+    if window is not None and not any(v for v in filters.values()):
+        try: raw = window(start, end, limit, offset)
+        except Exception:
+            log.exception("range query failed on %s", poller.source.source)
+            raw = None
+        if raw is not None and resolve_columns(raw)["id"] is not None:
+            got = prepare(raw, data.digest)
+            if got is not None: return got.df.head(limit)
+    return data.events(start, end, **filters).iloc[offset:offset + limit]
@@ -0,0 +1,113 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# STAGE TIMINGS & COUNTERS
+# =========================
+# One process-wide registry shared by the poller thread and every session.
+# Stages keep their last RECENT durations for quantiles plus running totals;
+# counters only go up, gauges hold the latest value. The dashboard shows them in
+# the admin sidebar and can export them as Prometheus text (a ``.prom`` file for
+# node_exporter's textfile collector) or as JSON lines.
+
+RECENT = 512
+PREFIX = "dashboard"
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recent = {}   # stage -> deque of seconds
+        self.totals = {}   # stage -> [count, seconds]
+        self.counters = {}
+        self.gauges = {}
+        self.exported_at = 0.0
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.recent.setdefault(stage, deque(maxlen=RECENT)).append(seconds)
+            t = self.totals.setdefault(stage, [0, 0.0])
+            t[0] += 1
+            t[1] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe(stage, time.perf_counter() - t0)
+
+    def timed(self, stage):
+        """Decorator form of ``timer``."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kw):
+                with self.timer(stage): return fn(*args, **kw)
+            return inner
+        return wrap
+
+    def laps(self, prefix=""):
+        """``lap(name)`` records the time since the previous lap (or since this call) as ``prefix + name``."""
+        last = [time.perf_counter()]
+        def lap(name):
+            now_ = time.perf_counter()
+            self.observe(prefix + name, now_ - last[0])
+            last[0] = now_
+        return lap
+
+    def inc(self, name, n=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        with self.lock: self.gauges[name] = value
+
+    def summary(self) -> pd.DataFrame:
+        with self.lock: items = [(k, np.array(v), self.totals[k]) for k, v in self.recent.items()]
+        rows = [dict(stage=k, count=t[0], last_ms=v[-1] * 1e3, p50_ms=np.percentile(v, 50) * 1e3,
+                     p95_ms=np.percentile(v, 95) * 1e3, total_s=t[1]) for k, v, t in sorted(items)]
+        return pd.DataFrame(rows, columns=["stage", "count", "last_ms", "p50_ms", "p95_ms", "total_s"]).round(2)
+
+    def prometheus(self) -> str:
+        with self.lock:
+            items = [(k, np.array(v), list(self.totals[k])) for k, v in sorted(self.recent.items())]
+            counters, gauges = dict(self.counters), dict(self.gauges)
+        out = [f"# HELP {PREFIX}_stage_seconds Duration of dashboard pipeline and render stages.",
+               f"# TYPE {PREFIX}_stage_seconds summary"]
+        for k, v, (count, total) in items:
+            for q in (0.5, 0.95): out.append(f'{PREFIX}_stage_seconds{{stage="{k}",quantile="{q}"}} {np.quantile(v, q):.6f}')
+            out.append(f'{PREFIX}_stage_seconds_sum{{stage="{k}"}} {total:.6f}')
+            out.append(f'{PREFIX}_stage_seconds_count{{stage="{k}"}} {count}')
+        for k, v in sorted(counters.items()): out += [f"# TYPE {PREFIX}_{k}_total counter", f"{PREFIX}_{k}_total {v}"]
+        for k, v in sorted(gauges.items()): out += [f"# TYPE {PREFIX}_{k} gauge", f"{PREFIX}_{k} {v}"]
+        return "\n".join(out) + "\n"
+
+    def record(self) -> dict:
+        """JSON-able snapshot: latest duration per stage, counters and gauges."""
+        with self.lock:
+            return {"time": time.time(), "stages": {k: v[-1] for k, v in self.recent.items()},
+                    "counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+    def export(self, path, min_interval=5.0):
+        """Write Prometheus text (``*.prom``, replaced atomically) or append one JSON line; rate-limited per process."""
+        with self.lock:
+            now_ = time.time()
+            if now_ - self.exported_at < min_interval: return False
+            self.exported_at = now_
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if path.endswith(".prom"):
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f: f.write(self.prometheus())
+            os.replace(tmp, path)
+        else:
+            with open(path, "a") as f: f.write(json.dumps(self.record()) + "\n")
+        return True
+
+
+METRICS = Metrics()
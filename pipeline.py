@@ -0,0 +1,317 @@
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from dateutil import parser
+
+# pandas columns and indexes use the zone *name*: pandas resolves it to a tz with
+# precomputed transitions, so .dt.hour / floor / tz_localize stay vectorized
+# (with a ZoneInfo object they fall back to a per-element Python loop)
+TZ_NAME = "Asia/Kuala_Lumpur"
+TZ = ZoneInfo(TZ_NAME)  # for scalar datetimes
+
+# =========================
+# TIMESTAMPS
+# =========================
+def parse_ts(x):
+    if pd.isna(x): return pd.NaT
+    s = str(x).strip()
+    if s == "": return pd.NaT
+    try:
+        if "/" in s and ":" in s and "t" not in s.lower():
+            dt = datetime.strptime(s, "%d/%m/%Y %H:%M")
+            return dt.replace(tzinfo=TZ)
+    except: pass
+    try:
+        dt = parser.isoparse(s)
+        if dt.tzinfo is None: dt = dt.replace(tzinfo=TZ)
+        return dt.astimezone(TZ)
+    except: return pd.NaT
+
+# Only the common extended ISO shape goes through the bulk parser; anything more
+# exotic is left to dateutil so both paths accept exactly the same strings.
+_ISO_SHAPE = r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}(?::\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?)?$"
+_ISO_TZ = r"[T ]\S*(?:Z|[+-]\d{2}(?::?\d{2})?)$"
+
+_NAT = np.datetime64("NaT", "ns")
+
+def _local_to_utc(naive: pd.Series) -> np.ndarray:
+    # wall times in a gap/overlap come back NaT and are resolved by parse_ts like before
+    local = naive.dt.tz_localize(TZ_NAME, ambiguous="NaT", nonexistent="NaT")
+    return local.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("M8[ns]")
+
+def _to_utc(parsed: pd.Series) -> np.ndarray:
+    if getattr(parsed.dt, "tz", None) is None: return _local_to_utc(parsed)
+    return parsed.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("M8[ns]")
+
+def _dmy_fixed(u: np.ndarray):
+    # zero-padded "dd/mm/YYYY HH:MM" -> "YYYY-mm-ddTHH:MM" by shuffling characters,
+    # which pandas then parses with its C ISO parser instead of strptime
+    c = u.astype("U16").view("U1").reshape(-1, 16)
+    ok = (c[:, 2] == "/") & (c[:, 5] == "/") & (c[:, 10] == " ") & (c[:, 13] == ":")
+    d = c[:, [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15]]
+    ok &= ((d >= "0") & (d <= "9")).all(axis=1)
+    iso = c[:, [6, 7, 8, 9, 2, 3, 4, 5, 0, 1, 10, 11, 12, 13, 14, 15]]
+    iso[:, 4] = iso[:, 7] = "-"
+    iso[:, 10] = "T"
+    return ok, np.ascontiguousarray(iso).view("U16").ravel()
+
+def parse_ts_series(series: pd.Series) -> pd.Series:
+    """Vectorized ``series.apply(parse_ts)``.
+
+    The two sheet formats (``%d/%m/%Y %H:%M`` and ISO-8601) are parsed in bulk;
+    only strings neither bulk pass understood go through ``parse_ts``.
+    """
+    vals = series.to_numpy(dtype=object)
+    u = np.strings.strip(np.where(pd.isna(vals), "", vals).astype(str))
+    out = np.full(len(u), _NAT)
+    lens = np.strings.str_len(u)
+
+    fixed = np.flatnonzero(lens == 16)
+    if fixed.size:
+        ok, iso = _dmy_fixed(u[fixed])
+        if ok.any():
+            out[fixed[ok]] = _local_to_utc(pd.to_datetime(pd.Series(iso[ok]), format="%Y-%m-%dT%H:%M", errors="coerce"))
+
+    idx = np.flatnonzero((lens > 0) & np.isnat(out))
+    s = pd.Series(u[idx], dtype=object)
+    dmy = s.str.contains("/", regex=False) & s.str.contains(":", regex=False) & ~s.str.contains("t", case=False, regex=False)
+    if dmy.any():
+        out[idx[dmy.to_numpy()]] = _local_to_utc(pd.to_datetime(s[dmy], format="%d/%m/%Y %H:%M", errors="coerce"))
+
+    iso = ~dmy & s.str.match(_ISO_SHAPE)
+    aware = iso & s.str.contains(_ISO_TZ, regex=True)
+    for m, utc in ((aware, True), (iso & ~aware, False)):
+        if not m.any(): continue
+        try:
+            out[idx[m.to_numpy()]] = _to_utc(pd.to_datetime(s[m], format="ISO8601", errors="coerce", utc=utc))
+        except (ValueError, TypeError):
+            pass  # mixed offsets in the "naive" bucket: leave them to the slow path
+
+    rest = idx[np.isnat(out[idx])]
+    if rest.size:
+        slow = pd.to_datetime(pd.Series(u[rest], dtype=object).map(parse_ts), errors="coerce", utc=True)
+        out[rest] = slow.dt.tz_localize(None).to_numpy("M8[ns]")
+    return pd.Series(out, index=series.index).dt.tz_localize("UTC").dt.tz_convert(TZ_NAME)
+
+# =========================
+# COLUMN NORMALIZATION
+# =========================
+SINGLE_CAMERA_NAME = "WEBCAM"    # sheets without a camera column (or blank cells) are one feed
+SINGLE_LOCATION_NAME = "WEBCAM"
+CATEGORY_ROLES = ("cam", "camtype", "loc", "sev", "status")
+PARTITION_ROLES = ("cam", "loc")  # Dataset and Rollups keep one partition per value of these
+TEXT = "string[pyarrow]"          # ids and URLs: one Arrow buffer instead of a Python object per cell
+
+def pick_col(df, candidates):
+    for c in candidates:
+        if c in df.columns: return c
+    return None
+
+def coerce_int_series(s, default=1):
+    return pd.to_numeric(s, errors="coerce").fillna(default).clip(lower=0).astype(int)
+
+def normalize_confidence(series):
+    x = pd.to_numeric(series, errors="coerce")
+    if x.notna().sum() == 0: return x
+    med = np.nanmedian(x.values.astype(float))
+    if med <= 1.0: x = x * 100.0
+    return x.clip(0, 100)
+
+def resolve_columns(raw) -> dict:
+    img_candidates = [c for c in raw.columns if ("url" in c or "image" in c or "snapshot" in c or "photo" in c)]
+    return {
+        "ts": pick_col(raw, ["timestamp", "time", "datetime", "date_time"]),
+        "id": pick_col(raw, ["detection_id", "det_id", "id", "event_id"]),
+        "loc": pick_col(raw, ["location", "area", "zone"]),
+        "cam": pick_col(raw, ["camera", "camera_id", "cam"]),
+        "camtype": pick_col(raw, ["camera_type", "type"]),
+        "dogs": pick_col(raw, ["dogs", "dog_count", "num_dogs"]),
+        "conf": pick_col(raw, ["confidence", "conf", "score"]),
+        "sev": pick_col(raw, ["severity", "priority", "level"]),
+        "status": pick_col(raw, ["status", "alert_status"]),
+        "img": pick_col(raw, ["snapshot_url", "image_url", "url"]) or (img_candidates[0] if img_candidates else None),
+    }
+
+def make_uids(ids, ts):
+    # detection id + epoch nanoseconds: stable across data versions and cheap to build
+    ns = ts.to_numpy("M8[ns]").astype(np.int64).astype(str)
+    return pd.Series(np.strings.add(np.strings.add(ids.astype(str).to_numpy(str), "__"), ns), index=ids.index, dtype=TEXT)
+
+def concat_prepared(frames, cols) -> pd.DataFrame:
+    # align categories first so pd.concat keeps the categorical dtypes instead of falling back to object
+    frames = [f.copy(deep=False) for f in frames]
+    for role in CATEGORY_ROLES:
+        c = cols[role]
+        cats = frames[0][c].cat.categories
+        for f in frames[1:]: cats = cats.append(f[c].cat.categories.difference(cats))
+        for f in frames: f[c] = f[c].cat.set_categories(cats)
+    return pd.concat(frames, ignore_index=True)
+
+def group_ages(s, base=0) -> dict:
+    """{label: ages} for a categorical column of a newest-first frame.
+
+    A row's age is its position counted from the oldest row (``base`` + len - 1 - pos), which
+    does not change when newer rows are prepended; each array is newest first.
+    """
+    codes = s.cat.codes.to_numpy()
+    order = np.argsort(codes, kind="stable")  # stable: positions stay newest first within a label
+    bounds = np.searchsorted(codes[order], np.arange(len(s.cat.categories) + 1))
+    ages = base + len(codes) - 1 - order
+    return {label: ages[bounds[i]:bounds[i + 1]] for i, label in enumerate(s.cat.categories) if bounds[i + 1] > bounds[i]}
+
+def to_local(x) -> pd.Timestamp:
+    """A datetime (naive means local) or a local date (its midnight) as a tz-aware Timestamp."""
+    if isinstance(x, datetime): return pd.Timestamp(x).tz_convert(TZ_NAME) if x.tzinfo else pd.Timestamp(x, tz=TZ_NAME)
+    if isinstance(x, date): return pd.Timestamp(datetime.combine(x, time()), tz=TZ_NAME)
+    return pd.Timestamp(x).tz_convert(TZ_NAME)
+
+class Dataset:
+    """A prepared, typed detection frame sorted newest first, plus its column roles.
+
+    ``parts[role][label]`` holds the ages (see ``group_ages``) of the rows of each camera
+    and location; ``part()`` turns one into its own Dataset. ``dropped`` counts the rows
+    ``trim`` removed over time, so ``dropped + len`` is the number of rows ever ingested.
+    """
+
+    def __init__(self, df, cols, digest="", parts=None, dropped=0):
+        self.df = df
+        self.cols = cols
+        self.digest = digest
+        self.dropped = dropped
+        if parts is None: parts = {role: group_ages(df[cols[role]]) for role in PARTITION_ROLES}
+        self.parts = parts
+        self._part_cache = {}
+        # uid -> row position; pandas builds the hash table lazily on the first lookup
+        self.uid_index = pd.Index(df["uid"])
+        # rows are newest first, so negated epoch nanoseconds form an ascending key for searchsorted
+        self.neg_ns = -df["ts"].to_numpy("M8[ns]").astype(np.int64)
+
+    def __len__(self): return len(self.df)
+
+    def row(self, uid):
+        try: pos = self.uid_index.get_loc(uid)
+        except KeyError: return None
+        if isinstance(pos, slice): pos = pos.start
+        elif not isinstance(pos, (int, np.integer)): pos = int(np.argmax(pos))  # duplicates: newest wins
+        return self.df.iloc[pos]
+
+    def part(self, role, label) -> "Dataset":
+        """The rows of one camera (``role="cam"``) or location (``"loc"``), built once per Dataset."""
+        key = (role, label)
+        if key not in self._part_cache:
+            ages = self.parts[role].get(label, np.empty(0, dtype=np.int64))
+            df = self.df.iloc[len(self.df) - 1 - ages].reset_index(drop=True)
+            self._part_cache[key] = Dataset(df, self.cols, self.digest, {r: {} for r in PARTITION_ROLES})
+        return self._part_cache[key]
+
+    def trim(self, cutoff) -> "Dataset":
+        """Only the rows with ts >= ``cutoff``; ages shift down by the number of rows dropped."""
+        _, hi = self.bounds(cutoff)
+        dropped = len(self) - hi
+        if dropped == 0: return self
+        parts = {role: {label: ages[ages >= dropped] - dropped for label, ages in p.items() if ages[0] >= dropped}
+                 for role, p in self.parts.items()}
+        return Dataset(self.df.iloc[:hi].copy(), self.cols, self.digest, parts, self.dropped + dropped)
+
+    def before(self, cutoff) -> "Dataset":
+        """Only the rows with ts < ``cutoff``; ages count from the oldest row, so the kept ones keep theirs."""
+        lo, _ = self.bounds(None, cutoff)
+        if lo == 0: return self
+        n = len(self) - lo
+        parts = {role: {label: ages[ages < n] for label, ages in p.items() if ages[-1] < n} for role, p in self.parts.items()}
+        return Dataset(self.df.iloc[lo:].reset_index(drop=True), self.cols, self.digest, parts, self.dropped)
+
+    def labels(self, role) -> list:
+        return sorted(self.parts[role], key=str)
+
+    def extend(self, new: "Dataset", digest="") -> "Dataset":
+        """A new Dataset with ``new``'s rows merged in; ``self`` is left untouched."""
+        if len(new) == 0: return Dataset(self.df, self.cols, digest or self.digest, self.parts, self.dropped)
+        if len(self) == 0: return Dataset(new.df, new.cols, digest or new.digest, new.parts, self.dropped)
+        df = concat_prepared([new.df, self.df], self.cols)
+        # detections normally arrive in time order, so the merge is a plain prepend
+        if new.df["ts"].iat[-1] < self.df["ts"].iat[0]:
+            df = df.sort_values("ts", ascending=False, kind="stable").reset_index(drop=True)
+            return Dataset(df, self.cols, digest, dropped=self.dropped)
+        # prepending keeps every existing age, so only the partitions with new rows change
+        parts = {}
+        for role in PARTITION_ROLES:
+            parts[role] = dict(self.parts[role])
+            for label, ages in group_ages(new.df[self.cols[role]], base=len(self)).items():
+                old = parts[role].get(label)
+                parts[role][label] = ages if old is None else np.concatenate([ages, old])
+        return Dataset(df, self.cols, digest, parts, self.dropped)
+
+    def bounds(self, start=None, end=None):
+        """Row positions ``lo:hi`` of detections with start <= ts < end (O(log n))."""
+        lo = 0 if end is None else int(np.searchsorted(self.neg_ns, -to_local(end).value, "right"))
+        hi = len(self.neg_ns) if start is None else int(np.searchsorted(self.neg_ns, -to_local(start).value, "right"))
+        return lo, max(lo, hi)
+
+    def window(self, start=None, end=None) -> pd.DataFrame:
+        """Newest-first slice of detections with start <= ts < end; ``start``/``end`` are datetimes or local dates."""
+        lo, hi = self.bounds(start, end)
+        return self.df.iloc[lo:hi]
+
+    def events(self, start=None, end=None, severities=None, statuses=None, min_dogs=None, conf=None) -> pd.DataFrame:
+        """``window(start, end)`` narrowed by severity/status sets, a minimum dog count and a
+        ``(lo, hi)`` confidence range in percent; only the rows inside the time slice are scanned."""
+        df = self.window(start, end)
+        c = self.cols
+        mask = np.ones(len(df), dtype=bool)
+        if severities: mask &= df[c["sev"]].isin(severities).to_numpy()
+        if statuses: mask &= df[c["status"]].isin(statuses).to_numpy()
+        if min_dogs: mask &= df[c["dogs"]].to_numpy() >= min_dogs
+        if conf is not None: mask &= df[c["conf"]].between(*conf).to_numpy()
+        return df if mask.all() else df[mask]
+
+    def day(self, day) -> pd.DataFrame:
+        return self.window(day, day + timedelta(days=1))
+
+    def date_span(self):
+        if len(self.df) == 0: return None
+        return self.df["ts"].iat[-1].date(), self.df["ts"].iat[0].date()
+
+def prepare(raw, digest="", id_offset=0) -> "Dataset | None":
+    """Resolve columns and derive the typed frame the dashboard renders from.
+
+    Returns ``None`` when the sheet has no timestamp column. ``id_offset`` continues
+    the generated DET-nnnnnn numbering when ``raw`` is a chunk appended to earlier rows.
+    """
+    cols = resolve_columns(raw)
+    if cols["ts"] is None: return None
+
+    df = raw.copy()
+    df["ts"] = parse_ts_series(df[cols["ts"]])
+    df = df.dropna(subset=["ts"])
+    if cols["ts"] != "ts": df = df.drop(columns=cols["ts"])  # the parsed column replaces the text
+    cols["ts"] = "ts"
+
+    if cols["id"] is None: df["detection_id"] = ["DET-" + str(i).zfill(6) for i in range(id_offset + 1, id_offset + len(df) + 1)]; cols["id"] = "detection_id"
+    if cols["cam"] is None: df["camera"] = SINGLE_CAMERA_NAME; cols["cam"] = "camera"
+    if cols["camtype"] is None: df["camera_type"] = SINGLE_CAMERA_NAME; cols["camtype"] = "camera_type"
+    if cols["loc"] is None: df["location"] = SINGLE_LOCATION_NAME; cols["loc"] = "location"
+    if cols["dogs"] is None: df["dogs"] = 1; cols["dogs"] = "dogs"
+    if cols["conf"] is None: df["confidence"] = np.nan; cols["conf"] = "confidence"
+    if cols["status"] is None: df["status"] = "NEW"; cols["status"] = "status"
+
+    df[cols["dogs"]] = coerce_int_series(df[cols["dogs"]], default=1).astype(np.int32)
+    df[cols["conf"]] = normalize_confidence(df[cols["conf"]]).astype(np.float32)
+    if cols["sev"] is None:
+        dnum = df[cols["dogs"]].astype(int)
+        df["severity"] = np.where(dnum >= 4, "CRITICAL", np.where(dnum >= 3, "HIGH", np.where(dnum >= 2, "MEDIUM", "LOW")))
+        cols["sev"] = "severity"
+
+    df[cols["cam"]] = df[cols["cam"]].fillna(SINGLE_CAMERA_NAME)
+    df[cols["camtype"]] = df[cols["camtype"]].fillna(SINGLE_CAMERA_NAME)
+    df[cols["loc"]] = df[cols["loc"]].fillna(SINGLE_LOCATION_NAME)
+    # low-cardinality text columns: categoricals share one copy of each label
+    for role in CATEGORY_ROLES: df[cols[role]] = df[cols[role]].astype("category")
+    for c in (cols["id"], cols["img"]):
+        if c is not None: df[c] = df[c].astype(TEXT)
+    df["hour"] = df["ts"].dt.hour.astype(np.int8)
+    df = df.sort_values("ts", ascending=False, kind="stable").reset_index(drop=True)
+    df["uid"] = make_uids(df[cols["id"]], df["ts"])
+    return Dataset(df, cols, digest)
@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from pipeline import PARTITION_ROLES, TZ_NAME, to_local
+
+# =========================
+# HOURLY ROLLUPS
+# =========================
+# KPI cards and analytics charts only need counts per hour, so we keep one row
+# per local hour (a year of history is ~9k rows) and fold new detections into
+# it as they arrive instead of re-filtering and re-grouping the raw frame. Every
+# camera and location gets its own child Rollups, updated the same way. Once the
+# raw rows of a day leave the retention window its hour buckets are folded into a
+# single bucket at local midnight, so day-aligned queries still see all history.
+
+SEVERITIES = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+COUNTS = ["detections", "dogs", "new"] + SEVERITIES
+
+
+def label_mask(s, *labels) -> np.ndarray:
+    """``s.astype(str).str.upper().isin(labels)``, evaluated once per category for categoricals."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        hit = s.cat.categories.astype(str).str.upper().isin(labels)
+        return np.append(hit, "NAN" in labels)[s.cat.codes.to_numpy()]  # code -1 (NaN) -> last slot
+    return s.astype(str).str.upper().isin(labels).to_numpy()
+
+
+def row_counts(df, cols) -> pd.DataFrame:
+    sev, status = df[cols["sev"]], df[cols["status"]]
+    return pd.DataFrame({
+        "detections": 1,
+        "dogs": df[cols["dogs"]].astype(np.int64),
+        "new": label_mask(status, "NEW"),
+        "CRITICAL": label_mask(sev, "CRITICAL"),
+        "HIGH": label_mask(sev, "HIGH"),
+        "MEDIUM": label_mask(sev, "MEDIUM", ""),  # blank severity is shown as MEDIUM
+        "LOW": label_mask(sev, "LOW"),
+    }, index=df.index).astype(np.int64)
+
+
+def bucket_rows(df, cols) -> pd.DataFrame:
+    """Sum one prepared frame into per-hour count rows (index: local hour start)."""
+    return row_counts(df, cols).groupby(df["ts"].dt.floor("h")).sum()
+
+
+class Rollups:
+    """Immutable per-hour counts; ``add`` returns a new instance.
+
+    ``parts[role][label]`` is the child Rollups of one camera / location (children have no parts).
+    Buckets before ``compacted`` are whole days (see ``compact``).
+    """
+
+    def __init__(self, hourly=None, parts=None, compacted=None):
+        if hourly is None:
+            hourly = pd.DataFrame(columns=COUNTS, dtype=np.int64, index=pd.DatetimeIndex([], tz=TZ_NAME))
+        self.hourly = hourly
+        self.parts = parts if parts is not None else {role: {} for role in PARTITION_ROLES}
+        self.compacted = compacted
+
+    def __len__(self): return int(self.hourly["detections"].sum())
+
+    def _merge(self, buckets) -> pd.DataFrame:
+        return self.hourly.add(buckets, fill_value=0).astype(np.int64).sort_index()
+
+    def add(self, df, cols, sign=1) -> "Rollups":
+        """Count ``df``'s rows in (``sign=-1``: take back rows counted earlier)."""
+        if len(df) == 0: return self
+        counts, hour = row_counts(df, cols) * sign, df["ts"].dt.floor("h")
+        # rows of days already compacted (late arrivals, incidents that reopen) go to their day's bucket
+        if self.compacted is not None: hour = hour.where(hour >= self.compacted, df["ts"].dt.floor("D"))
+        parts = {}
+        for role in PARTITION_ROLES:
+            # one groupby per role; only the labels present in ``df`` get a new child
+            parts[role] = dict(self.parts.get(role, {}))
+            grouped = counts.groupby([df[cols[role]], hour], observed=True).sum()
+            for label, buckets in grouped.groupby(level=0, observed=True):
+                child = parts[role].get(label) or EMPTY
+                parts[role][label] = Rollups(child._merge(buckets.droplevel(0)), {})
+        return Rollups(self._merge(counts.groupby(hour).sum()), parts, self.compacted)
+
+    def part(self, role, label) -> "Rollups":
+        return self.parts.get(role, {}).get(label) or EMPTY
+
+    def _map(self, fn, compacted) -> "Rollups":
+        parts = {role: {k: Rollups(fn(v.hourly), {}) for k, v in p.items()} for role, p in self.parts.items()}
+        return Rollups(fn(self.hourly), parts, compacted)
+
+    def compact(self, cutoff) -> "Rollups":
+        """Fold the hour buckets before ``cutoff`` (a local midnight) into one bucket per day."""
+        cutoff = to_local(cutoff)
+        def fold(h):
+            pos = h.index.searchsorted(cutoff)
+            if pos == 0: return h
+            old = h.iloc[:pos]
+            return pd.concat([old.groupby(old.index.floor("D")).sum(), h.iloc[pos:]])
+        return self._map(fold, cutoff)
+
+    def before(self, cutoff) -> "Rollups":
+        """Only the buckets before ``cutoff``, e.g. the compacted history to archive."""
+        cutoff = to_local(cutoff)
+        return self._map(lambda h: h.iloc[:h.index.searchsorted(cutoff)], cutoff)
+
+    def merge(self, other: "Rollups") -> "Rollups":
+        parts = {}
+        for role in PARTITION_ROLES:
+            parts[role] = dict(self.parts.get(role, {}))
+            for label, child in other.parts.get(role, {}).items():
+                mine = parts[role].get(label)
+                parts[role][label] = child if mine is None else Rollups(mine._merge(child.hourly), {})
+        return Rollups(self._merge(other.hourly), parts, self.compacted or other.compacted)
+
+    def window(self, start, end=None) -> pd.DataFrame:
+        """Hour buckets with start <= bucket < end (``start``/``end``: datetimes or dates)."""
+        lo = self.hourly.index.searchsorted(to_local(start), "left")
+        hi = len(self.hourly) if end is None else self.hourly.index.searchsorted(to_local(end), "left")
+        return self.hourly.iloc[lo:hi]
+
+    def totals(self, start, end=None) -> pd.Series:
+        t = self.window(start, end).sum().reindex(COUNTS, fill_value=0).astype(int)
+        t["high"] = t["CRITICAL"] + t["HIGH"]
+        return t
+
+    def day(self, day) -> pd.Series:
+        return self.totals(day, day + timedelta(days=1))
+
+    def last_24h(self, now_) -> pd.DataFrame:
+        # the current hour plus the 23 full hours before it, one bucket per hour of day
+        cur = to_local(now_).floor("h")
+        w = self.window(cur - pd.Timedelta(hours=23), cur + pd.Timedelta(hours=1))
+        hourly = w[["detections", "dogs"]].groupby(w.index.hour).sum()
+        return hourly.reindex(range(24), fill_value=0).rename_axis("hour").reset_index()
+
+    def daily(self, start, end=None) -> pd.DataFrame:
+        w = self.window(pd.Timestamp(start).floor("h"), end)
+        return w[["detections", "dogs"]].groupby(w.index.date).sum().rename_axis("day").reset_index()
+
+    def severity(self, start, end=None) -> pd.Series:
+        return self.window(pd.Timestamp(start).floor("h"), end)[SEVERITIES].sum().astype(int)
+
+    def hourly_dogs(self, day) -> dict:
+        """{hour: dogs} for one local day, the input ``compute_peak_2hr`` expects."""
+        w = self.window(day, day + timedelta(days=1))
+        return {int(h): int(v) for h, v in zip(w.index.hour, w["dogs"])}
+
+
+EMPTY = Rollups(parts={})
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from ingest import IncrementalCsv, clean_cols
+from metrics import METRICS
+from pipeline import TZ_NAME, parse_ts_series, resolve_columns, to_local
+
+# =========================
+# DATA SOURCES
+# =========================
+# Everything the poller reads from implements the IncrementalCsv interface:
+#   refresh(max_age) -> new raw rows (string columns, cleaned names) or None
+#   resynced / version / digest / resyncs / fetched_at / lock / source / timeout
+#   checkpoint() / restore(cp) for the warm-start cache
+# Sources that can answer range queries themselves also provide
+#   window(start, end=None, limit=None, offset=0) -> raw rows newest first, or None
+# which live.recent() uses instead of scanning the in-memory frame.
+# Push sources also set an ``arrived`` Event, which wakes the poller right away.
+
+
+def stringify(df: pd.DataFrame) -> pd.DataFrame:
+    # same shape as read_csv(dtype=str): text values, NaN for missing
+    return df.apply(lambda c: c.map(str, na_action="ignore")).astype(object)
+
+
+def has_timestamp(names) -> bool:
+    return resolve_columns(clean_cols(pd.DataFrame(columns=list(names))))["ts"] is not None
+
+
+def parse_json_rows(body: bytes) -> list:
+    """Detection objects from a JSON object, a JSON array of objects, or JSON lines."""
+    try: obj = json.loads(body)
+    except ValueError: obj = None
+    if isinstance(obj, dict): return [obj]
+    if isinstance(obj, list): return [o for o in obj if isinstance(o, dict)]
+    rows = []
+    for line in body.splitlines():
+        if not line.strip(): continue
+        try: obj = json.loads(line)
+        except ValueError: continue  # same policy as on_bad_lines="skip"
+        if isinstance(obj, dict): rows.append(obj)
+    return rows
+
+
+class JsonlTail(IncrementalCsv):
+    """A local (or HTTP) JSON-lines log, one detection object per line, read from its byte offset."""
+
+    def _parse(self, new) -> pd.DataFrame:
+        self.header = b""
+        return clean_cols(stringify(pd.DataFrame(parse_json_rows(new))))
+
+
+class SqliteSource:
+    """Rows appended to a SQLite table, fetched by rowid.
+
+    Range queries are pushed down to an index on the timestamp column when the stored
+    timestamps are ISO-8601 text in local time, so text order is time order; otherwise
+    (checked on a sample of the oldest and newest rows) ``window`` returns None and
+    live.recent() scans the in-memory rows instead. A shrinking table (deleted or rewritten rows) triggers a full resync.
+    """
+
+    def __init__(self, path, table="detections", timeout=15):
+        self.path, self.table, self.timeout = path, table, timeout
+        self.source = f"sqlite:///{path}?table={table}"
+        self.lock = threading.Lock()
+        self.version = self.resyncs = 0
+        self.bytes_fetched = 0
+        self.frame = pd.DataFrame()
+        self.fetched_at = 0.0
+        self.last_rowid = self.rows = 0
+        self.digest = ""
+        self.resynced = False
+        self.columns = self._columns()
+        self.ts_col = self.columns.get(resolve_columns(pd.DataFrame(columns=list(self.columns)))["ts"])
+        self.iso_ts = None  # unknown until the table has rows
+        self.ensure_index()
+        self.sortable_ts()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def _columns(self) -> dict:
+        # cleaned name -> name in the table
+        with self._connect() as con:
+            names = [r[1] for r in con.execute(f'PRAGMA table_info("{self.table}")')]
+        return dict(zip(clean_cols(pd.DataFrame(columns=names)).columns, names))
+
+    def ensure_index(self):
+        if self.ts_col is None: return
+        try:
+            with self._connect() as con:
+                con.execute(f'CREATE INDEX IF NOT EXISTS "ix_{self.table}_ts" ON "{self.table}" ("{self.ts_col}")')
+        except sqlite3.OperationalError:
+            pass  # read-only database: range queries still work, just without the index
+
+    def sortable_ts(self, sample=500) -> bool:
+        """Whether stored timestamps sort as text like the local ISO bounds ``window`` compares them with."""
+        if self.iso_ts is not None or self.ts_col is None: return bool(self.iso_ts)
+        with self._connect() as con:
+            vals = [v for order in ("", " DESC") for (v,) in con.execute(
+                f'SELECT "{self.ts_col}" FROM "{self.table}" WHERE "{self.ts_col}" IS NOT NULL ORDER BY rowid{order} LIMIT ?', (sample,))]
+        if not vals: return False
+        text = pd.Series(vals, dtype=object)
+        ts = parse_ts_series(text)
+        self.iso_ts = bool(ts.notna().all() and (ts.dt.tz_convert(TZ_NAME).dt.strftime("%Y-%m-%dT%H:%M:%S") == text.str[:19]).all())
+        return self.iso_ts
+
+    @METRICS.timed("ingest.fetch")
+    def _query(self, sql, params=()):
+        with self._connect() as con:
+            df = pd.read_sql_query(sql, con, params=params)
+        return clean_cols(stringify(df))
+
+    def refresh(self, max_age=0):
+        with self.lock:
+            now_ = time.time()
+            if self.fetched_at and now_ - self.fetched_at < max_age: return None
+            self.fetched_at = now_
+            with self._connect() as con:
+                count = con.execute(f'SELECT count(*) FROM "{self.table}" WHERE rowid <= ?', (self.last_rowid,)).fetchone()[0]
+            self.resynced = count != self.rows
+            if self.resynced:
+                if self.version: self.resyncs += 1
+                self.last_rowid = self.rows = 0
+            delta = self._query(f'SELECT rowid AS _rowid, * FROM "{self.table}" WHERE rowid > ? ORDER BY rowid', (self.last_rowid,))
+            if len(delta) == 0 and not self.resynced: return None
+            if len(delta):
+                self.last_rowid = int(delta["_rowid"].astype(np.int64).max())
+                self.rows += len(delta)
+            self.digest = hashlib.sha1(f"{self.digest}:{self.resyncs}:{self.last_rowid}:{self.rows}".encode()).hexdigest()
+            self.version += 1
+            return delta.drop(columns="_rowid")
+
+    def window(self, start=None, end=None, limit=None, offset=0):
+        if not self.sortable_ts(): return None
+        where, params = [], []
+        if start is not None: where.append(f'"{self.ts_col}" >= ?'); params.append(to_local(start).strftime("%Y-%m-%dT%H:%M:%S"))
+        if end is not None: where.append(f'"{self.ts_col}" < ?'); params.append(to_local(end).strftime("%Y-%m-%dT%H:%M:%S"))
+        sql = f'SELECT * FROM "{self.table}"' + (" WHERE " + " AND ".join(where) if where else "")
+        sql += f' ORDER BY "{self.ts_col}" DESC' + (f" LIMIT {int(limit)} OFFSET {int(offset)}" if limit else "")
+        return self._query(sql, params)
+
+    def checkpoint(self) -> dict:
+        with self.lock:
+            return {"source": self.source, "last_rowid": self.last_rowid, "rows": self.rows, "digest": self.digest,
+                    "version": self.version, "resyncs": self.resyncs}
+
+    def restore(self, cp: dict):
+        with self.lock:
+            self.last_rowid, self.rows, self.digest = cp["last_rowid"], cp["rows"], cp["digest"]
+            self.version, self.resyncs = cp["version"], cp["resyncs"]
+
+
+class PushSource:
+    """Detections POSTed by the detector to a local HTTP endpoint instead of polled from the sheet.
+
+        curl -d '{"Timestamp": "2026-10-17T08:00:00+08:00", "Dogs": 2, "Camera": "CAM-01"}' http://127.0.0.1:8765/
+
+    The body is a JSON object, an array of objects or JSON lines (same fields as the
+    sheet's columns); a body without a timestamp field is refused with 400. Rows wait
+    in a bounded ring buffer until the poller drains them; if it falls more than
+    ``capacity`` rows behind, the oldest are dropped and counted.
+    Nothing is replayed across restarts beyond what the warm-start cache already holds.
+    """
+
+    MAX_BODY = 1 << 20
+
+    def __init__(self, host="127.0.0.1", port=8765, capacity=10000, timeout=15):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.arrived = threading.Event()
+        self.buffer = deque(maxlen=capacity)
+        self.version = self.resyncs = 0
+        self.bytes_fetched = self.pushed = self.dropped = 0
+        self.frame = pd.DataFrame()
+        self.fetched_at = 0.0
+        self.digest = ""
+        self.resynced = False
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.address = self.server.server_address
+        self.source = f"push://{host}:{port}"
+        threading.Thread(target=self.server.serve_forever, name=f"push:{port}", daemon=True).start()
+
+    def _handler(self):
+        source = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = self.headers.get("Content-Length")
+                if length is None:
+                    self.send_error(411)
+                    return
+                try: size = int(length)
+                except ValueError: size = -1
+                if size < 0:
+                    self.send_error(400, "bad Content-Length")
+                    return
+                if size > source.MAX_BODY:
+                    self.send_error(413)
+                    return
+                rows = parse_json_rows(self.rfile.read(size))
+                if not rows:
+                    self.send_error(400, "expected a JSON object, an array of objects or JSON lines")
+                    return
+                if not has_timestamp({k for r in rows for k in r}):
+                    self.send_error(400, "no timestamp field in the posted rows")
+                    return
+                source.push(rows, size)
+                body = json.dumps({"accepted": len(rows)}).encode()
+                self.send_response(202)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): pass
+
+        return Handler
+
+    def push(self, rows, size=0):
+        with self.lock:
+            overflow = max(0, len(self.buffer) + len(rows) - self.buffer.maxlen)
+            self.buffer.extend(rows)
+            self.pushed += len(rows)
+            self.dropped += overflow
+            self.bytes_fetched += size
+        METRICS.inc("rows_pushed", len(rows))
+        if overflow: METRICS.inc("push_dropped", overflow)
+        self.arrived.set()
+
+    def refresh(self, max_age=0):
+        with self.lock:
+            self.fetched_at = time.time()
+            if not self.buffer: return None
+            rows = list(self.buffer)
+            self.buffer.clear()
+            self.resynced = self.version == 0
+            self.digest = hashlib.sha1(f"{self.digest}:{self.pushed}".encode()).hexdigest()
+            self.version += 1
+        with METRICS.timer("ingest.parse"): return clean_cols(stringify(pd.DataFrame(rows)))
+
+    def checkpoint(self) -> dict:
+        with self.lock:
+            return {"source": self.source, "digest": self.digest, "version": self.version, "resyncs": self.resyncs}
+
+    def restore(self, cp: dict):
+        with self.lock: self.digest, self.version, self.resyncs = cp["digest"], cp["version"], cp["resyncs"]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def open_source(spec, keep_frame=True, **kw):
+    """``push://host:port``, ``sqlite:///path.db?table=t``, ``jsonl:///path.jsonl`` (or any ``*.jsonl``
+    path/URL), else a CSV path or URL."""
+    spec = str(spec)
+    if spec.startswith("push://"):
+        u = urlparse(spec)
+        return PushSource(u.hostname or "127.0.0.1", 8765 if u.port is None else u.port, **kw)  # port 0: any free port
+    if spec.startswith("sqlite://"):
+        u = urlparse(spec)
+        return SqliteSource(u.path, parse_qs(u.query).get("table", ["detections"])[0], **kw)
+    if spec.startswith("jsonl://"):
+        return JsonlTail(spec[len("jsonl://"):], keep_frame=keep_frame, **kw)
+    if urlparse(spec).path.endswith(".jsonl"):
+        return JsonlTail(spec, keep_frame=keep_frame, **kw)
+    return IncrementalCsv(spec, keep_frame=keep_frame, **kw)
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from pipeline import PARTITION_ROLES, TEXT, TZ_NAME, Dataset
+from rollups import COUNTS, Rollups
+
+# =========================
+# LOCAL COLUMNAR CACHE
+# =========================
+# The prepared frame is kept on disk as one uncompressed Feather (Arrow IPC) file
+# per local day, so a restart can load it back into memory in one conversion
+# instead of re-downloading and re-parsing the whole sheet. The files are
+# memory-mapped for the read, but the frame is an in-memory copy: the pipeline
+# needs numpy and categorical columns it can extend. Only the partitions
+# touched by new rows are rewritten. checkpoint.json records the ingest position
+# and per-day row counts; if they disagree with the files the cache is ignored.
+# Days that left the
+# retention window (and history bulk-loaded by backfill.py) only survive as the
+# compacted rollups in archive.feather, and their incident counts (see incidents.py)
+# in incidents.feather.
+
+CHECKPOINT = "checkpoint.json"
+ARCHIVE = "archive.feather"
+INCIDENT_ARCHIVE = "incidents.feather"
+
+
+def _part(root, day):
+    return os.path.join(root, f"day={day}.feather")
+
+
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def read_checkpoint(root):
+    try:
+        with open(os.path.join(root, CHECKPOINT)) as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+
+def save(root, data: Dataset, ingest: dict, days=None):
+    """Write the partitions for ``days`` (all days when None) and then the checkpoint."""
+    os.makedirs(root, exist_ok=True)
+    cp = read_checkpoint(root) if days is not None else None
+    counts = dict(cp["days"]) if cp and cp.get("ingest", {}).get("source") == ingest["source"] else {}
+    if days is None:
+        counts = {}
+        days = sorted({str(t.date()) for t in data.df["ts"].dt.normalize().unique()})
+        for name in os.listdir(root):
+            if name.startswith("day=") and name[4:-8] not in days: os.remove(os.path.join(root, name))
+
+    for day in days:
+        part = data.day(pd.Timestamp(day).date())
+        if len(part) == 0:
+            counts.pop(str(day), None)
+            if os.path.exists(_part(root, day)): os.remove(_part(root, day))
+            continue
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        _write_atomic(_part(root, day), lambda p: feather.write_feather(table, p, compression="uncompressed"))
+        counts[str(day)] = len(part)
+
+    body = {"ingest": ingest, "cols": data.cols, "digest": data.digest, "dropped": data.dropped, "days": counts}
+    _write_atomic(os.path.join(root, CHECKPOINT), lambda p: open(p, "w").write(json.dumps(body)))
+
+
+def load(root, source):
+    """Return ``(Dataset, ingest_checkpoint)`` from the cache, or None if it is missing or stale."""
+    cp = read_checkpoint(root)
+    if not cp or cp["ingest"].get("source") != str(source) or not cp["days"]: return None
+    tables = []
+    for day in sorted(cp["days"], reverse=True):  # newest partition first, like the prepared frame
+        try: t = feather.read_table(_part(root, day), memory_map=True)
+        except (OSError, pa.ArrowInvalid): return None
+        if t.num_rows != cp["days"][day]: return None
+        tables.append(t)
+    df = pa.concat_tables(tables, promote_options="permissive").to_pandas()  # copies every column into memory
+    df["ts"] = df["ts"].dt.tz_convert(TZ_NAME)  # same tz as freshly parsed rows, so later merges stay datetime64
+    for c in df.select_dtypes("string").columns: df[c] = df[c].astype(TEXT)  # pandas metadata drops the Arrow storage
+    return Dataset(df, cp["cols"], cp["digest"], dropped=cp.get("dropped", 0)), cp["ingest"]
+
+
+def save_archive(root, archive: Rollups, source, name=ARCHIVE):
+    """Persist compacted rollups (``Rollups.before(cutoff)``) of ``source`` as one long table: role, label, bucket, counts."""
+    os.makedirs(root, exist_ok=True)
+    frames = [(None, None, archive)] + [(role, label, r) for role in PARTITION_ROLES for label, r in archive.parts[role].items()]
+    df = pd.concat([r.hourly.rename_axis("bucket").reset_index().assign(role=role or "", label=str(label or ""))
+                    for role, label, r in frames], ignore_index=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {b"compacted": archive.compacted.isoformat().encode(), b"source": str(source).encode()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **meta})
+    _write_atomic(os.path.join(root, name), lambda p: feather.write_feather(table, p, compression="uncompressed"))
+
+
+def load_archive(root, source, name=ARCHIVE):
+    """The Rollups ``save_archive`` wrote for ``source``, or None."""
+    try: table = feather.read_table(os.path.join(root, name))
+    except (OSError, pa.ArrowInvalid): return None
+    if table.schema.metadata.get(b"source", b"").decode() != str(source): return None
+    compacted = pd.Timestamp(table.schema.metadata[b"compacted"].decode()).tz_convert(TZ_NAME)
+    df = table.to_pandas()
+    df["bucket"] = df["bucket"].dt.tz_convert(TZ_NAME)
+    hourly = {key: g.set_index("bucket")[COUNTS].astype("int64") for key, g in df.groupby(["role", "label"], sort=False)}
+    parts = {role: {label: Rollups(h, {}) for (r, label), h in hourly.items() if r == role} for role in PARTITION_ROLES}
+    return Rollups(hourly.get(("", ""), Rollups().hourly), parts, compacted)
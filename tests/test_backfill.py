@@ -0,0 +1,85 @@
+import io
+
+import pandas as pd
+
+import store
+from backfill import backfill, read_chunks
+from ingest import Poller
+from live import LivePipeline
+from sources import open_source
+from test_live import sheet
+
+SOURCE = "http://127.0.0.1:1/sheet.csv"
+
+
+def month(rows, m):
+    return rows[rows["Timestamp"].str[5:7] == f"{m:02d}"]
+
+
+def archived(root):
+    a = store.load_archive(root, SOURCE)
+    return int(a.hourly["detections"].sum()), a.compacted
+
+
+def test_chunks_report_file_line_numbers(tmp_path):
+    path = tmp_path / "export.csv"
+    lines = sheet(n=30).to_csv(index=False).splitlines()
+    lines[7] += ",extra"   # file line 8
+    lines[23] += ",x,y"    # file line 24
+    path.write_text("\n".join(lines) + "\n")
+    chunks = list(read_chunks(path, chunk_rows=10))
+    assert [first for first, _, _ in chunks] == [0, 10, 20]
+    assert sum(len(raw) for _, raw, _ in chunks) == 28
+    assert [line for _, _, bad in chunks for line, _ in bad] == [8, 24]
+
+
+def test_unreadable_file_is_reported_and_skipped(tmp_path):
+    good, bad = tmp_path / "good.csv", tmp_path / "bad.csv"
+    sheet(n=100, seed=1).to_csv(good, index=False)
+    lines = sheet(n=100, seed=2).to_csv(index=False).splitlines()
+    lines[60] = lines[60].replace(",", ',"', 1)  # an unbalanced quote swallows the rest of the file
+    bad.write_text("\n".join(lines) + "\n")
+    report = io.StringIO()
+    got = backfill([str(bad), str(good)], SOURCE, str(tmp_path / "cache"), workers=1, chunk_rows=20, report=report)
+    assert got["broken_files"] == 1 and got["kept"] == 100 + 40
+    assert report.getvalue().startswith(f"{bad}:61: unreadable, skipped this file from data row 41 on")
+
+
+def test_later_months_and_reruns_merge_into_the_archive(tmp_path):
+    rows = sheet(n=6_000, days=90)  # March to May
+    root = str(tmp_path / "cache")
+    for m in (3, 4): month(rows, m).to_csv(tmp_path / f"{m}.csv", index=False)
+    assert backfill([str(tmp_path / "3.csv")], SOURCE, root, workers=1)["kept"] == len(month(rows, 3))
+    assert backfill([str(tmp_path / "4.csv")], SOURCE, root, workers=1)["kept"] == len(month(rows, 4))
+    assert archived(root) == (len(month(rows, 3)) + len(month(rows, 4)), pd.Timestamp("2025-05-01", tz="Asia/Kuala_Lumpur"))
+
+    report = io.StringIO()
+    got = backfill([str(tmp_path / "3.csv")], SOURCE, root, workers=1, report=report)
+    assert got["kept"] == 0 and got["overlap"]["archived"] == len(month(rows, 3))
+    assert f"{len(month(rows, 3))} on days already archived" in report.getvalue()
+    assert archived(root)[0] == len(month(rows, 3)) + len(month(rows, 4))
+
+
+def test_overlapping_exports_count_once(tmp_path):
+    rows = sheet(n=3_000, days=10)
+    rows.iloc[:2_000].to_csv(tmp_path / "a.csv", index=False)
+    rows.iloc[1_000:].to_csv(tmp_path / "b.csv", index=False)
+    report = io.StringIO()
+    got = backfill([str(tmp_path / "a.csv"), str(tmp_path / "b.csv")], SOURCE, str(tmp_path / "cache"), workers=1, chunk_rows=700, report=report)
+    assert got["kept"] == 3_000 and got["overlap"]["repeated"] == 1_000
+    assert f"{tmp_path / 'b.csv'}: not counted again: 1000 row(s) read from an earlier file" in report.getvalue()
+
+
+def test_only_days_before_the_live_cache_are_kept(tmp_path):
+    rows = sheet(n=4_000, days=8)
+    live = tmp_path / "sheet.csv"
+    rows.iloc[2_000:].to_csv(live, index=False)
+    root = str(tmp_path / "cache")
+    src = open_source(str(live), keep_frame=False)
+    Poller(src, 3600, derive=LivePipeline(src, root)).poll_once()
+    rows.to_csv(tmp_path / "export.csv", index=False)
+    first_day = pd.Timestamp(rows["Timestamp"].iat[2_000][:10], tz="Asia/Kuala_Lumpur")
+    older = (pd.to_datetime(rows["Timestamp"].str[:10]).dt.tz_localize("Asia/Kuala_Lumpur") < first_day).sum()
+    got = backfill([str(tmp_path / "export.csv")], str(live), root, workers=1)
+    assert got["kept"] == older and got["overlap"]["live"] == 4_000 - older
+    assert store.load_archive(root, str(live)).compacted == first_day
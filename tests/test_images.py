@@ -0,0 +1,92 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import fake_sheet
+import images
+from images import ImageCache
+
+
+@pytest.fixture
+def host(tmp_path):
+    root = tmp_path / "snapshots"
+    root.mkdir()
+    server = fake_sheet.serve(str(root))
+    server.root = root
+    server.url = "http://%s:%d/" % server.server_address
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def png(path, size=(800, 600)):
+    out = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(out, "PNG")
+    path.write_bytes(out.getvalue())
+
+
+def test_one_origin_request_per_url(host, tmp_path, monkeypatch):
+    png(host.root / "a.png")
+    cache = ImageCache(str(tmp_path / "cache"))
+    fetch = cache._fetch
+    def slow_fetch(url):  # keep the fetch in flight while the other threads ask
+        time.sleep(0.2)
+        return fetch(url)
+    monkeypatch.setattr(cache, "_fetch", slow_fetch)
+
+    start = threading.Barrier(8)
+    got = []
+    def ask(i):
+        start.wait()
+        got.append(cache.thumb(host.url + "a.png") if i % 2 else cache.get(host.url + "a.png"))
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert host.hits == 1
+    assert cache.key_locks == {}  # nothing kept per URL once the fetches are done
+    assert None not in got and len(set(got)) == 2  # the original and the thumbnail
+    assert Image.open(io.BytesIO(cache.thumb(host.url + "a.png"))).size == images.THUMB_SIZE
+    assert host.hits == 1
+
+
+def test_evicts_least_recently_used(host, tmp_path):
+    for name in "abcd": (host.root / name).write_bytes(os.urandom(1000))
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=3500)
+    for age, name in zip([30, 20, 10], "abc"):
+        cache.get(host.url + name)
+        os.utime(cache._path(host.url + name, ".img"), (time.time() - age,) * 2)
+    cache.get(host.url + "a")  # a is used again, so b is now the oldest
+    cache.get(host.url + "d")  # 4000 bytes: over the limit, trimmed back under 90% of it
+
+    assert [os.path.exists(cache._path(host.url + n, ".img")) for n in "abcd"] == [True, False, True, True]
+    assert cache.size == 3000 == sum(e.stat().st_size for e in os.scandir(cache.root))
+    assert host.hits == 4
+    assert cache.get(host.url + "b") == (host.root / "b").read_bytes()
+    assert host.hits == 5
+
+
+def test_backs_off_after_a_failed_fetch(host, tmp_path, monkeypatch):
+    cache = ImageCache(str(tmp_path / "cache"))
+    url = host.url + "late.png"
+    assert cache.get(url) is None  # 404
+    png(host.root / "late.png")
+    assert cache.get(url) is None and cache.thumb(url) is None
+    assert host.hits == 0  # not asked again within FAIL_RETRY_SEC
+
+    monkeypatch.setattr(images, "FAIL_RETRY_SEC", 0)
+    assert cache.get(url) == (host.root / "late.png").read_bytes()
+    assert host.hits == 1 and cache.failed == {}
+
+
+def test_failures_are_forgotten_once_expired(host, tmp_path, monkeypatch):
+    cache = ImageCache(str(tmp_path / "cache"))
+    for i in range(5): cache.get(host.url + f"gone{i}.png")
+    assert len(cache.failed) == 5
+    monkeypatch.setattr(images, "FAIL_RETRY_SEC", 0)
+    cache.get(host.url + "gone.png")
+    assert list(cache.failed) == [host.url + "gone.png"]
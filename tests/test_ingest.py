@@ -0,0 +1,119 @@
+import os
+
+import pandas as pd
+import pytest
+
+import fake_sheet
+from benchmarks import check_timestamps, synthetic_rows, synthetic_sheet
+from ingest import IncrementalCsv, parse_csv_bytes
+
+
+def test_timestamp_fast_path_matches_reference():
+    assert check_timestamps() > 0
+
+
+ROWS = synthetic_rows(800)
+
+
+def sheet(n, rows=ROWS) -> bytes:
+    return rows.iloc[:n].to_csv(index=False, lineterminator="\r\n").encode()
+
+
+@pytest.fixture(params=["file", "url"])
+def csv(request, tmp_path):
+    """A sheet and a source reading it: the file itself, or the file behind fake_sheet."""
+    path = tmp_path / "sheet.csv"
+    path.write_bytes(sheet(500))
+    if request.param == "file":
+        yield path, IncrementalCsv(str(path), verify_sec=3600)
+        return
+    server = fake_sheet.serve(str(path))
+    yield path, IncrementalCsv("http://%s:%d/" % server.server_address, verify_sec=3600)
+    server.shutdown()
+    server.server_close()
+
+
+def rewrite(path, body):
+    # bump the mtime too: a same-size rewrite inside one mtime tick would look unchanged to a file source
+    st = os.stat(path)
+    path.write_bytes(body)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def assert_whole_sheet(src, path):
+    pd.testing.assert_frame_equal(src.frame, parse_csv_bytes(path.read_bytes()))
+
+
+def test_appended_rows_are_the_delta(csv):
+    path, src = csv
+    assert len(src.refresh()) == 500 and src.resynced
+    before = src.bytes_fetched
+    body = sheet(800)
+    rewrite(path, body)
+    delta = src.refresh()
+    assert not src.resynced and src.resyncs == 0
+    pd.testing.assert_frame_equal(delta.reset_index(drop=True), parse_csv_bytes(body).iloc[500:].reset_index(drop=True))
+    assert_whole_sheet(src, path)
+    assert src.bytes_fetched - before < len(body) // 2  # only the new rows (and the check bytes) were read
+
+
+def test_nothing_new_is_none(csv):
+    path, src = csv
+    src.refresh()
+    fetched, version = src.bytes_fetched, src.version
+    assert src.refresh() is None  # unchanged mtime/size, or a 304
+    assert (src.bytes_fetched, src.version) == (fetched, version)
+
+
+def test_edited_row_resyncs(csv):
+    path, src = csv
+    src.refresh()
+    rows = ROWS.copy()
+    rows.loc[499, "Detection ID"] = "EDT-0000499"  # same length: only the bytes differ
+    rewrite(path, sheet(501, rows))
+    assert len(src.refresh()) == 501
+    assert src.resynced and src.resyncs == 1
+    assert src.frame["detection_id"].iat[499] == "EDT-0000499"
+    assert_whole_sheet(src, path)
+
+
+def test_truncated_sheet_resyncs(csv):
+    path, src = csv
+    src.refresh()
+    rewrite(path, sheet(200))
+    assert len(src.refresh()) == 200
+    assert src.resynced and src.resyncs == 1
+    assert_whole_sheet(src, path)
+
+
+def test_unfinished_line_waits_for_its_line_break(tmp_path):
+    path = tmp_path / "sheet.csv"
+    half = sheet(11)[len(sheet(10)):]
+    path.write_bytes(sheet(10) + half[:20])
+    src = IncrementalCsv(str(path))
+    assert len(src.refresh()) == 10
+    with open(path, "ab") as f: f.write(half[20:])
+    assert len(src.refresh()) == 1 and not src.resynced
+    assert_whole_sheet(src, path)
+
+
+
+def test_last_line_without_a_line_break(tmp_path):
+    path = tmp_path / "sheet.csv"
+    path.write_bytes(synthetic_sheet(3000))  # ends without a line break, like a published sheet
+    src = IncrementalCsv(str(path))
+    assert len(src.refresh()) == 2999  # the last line may still be being written
+    assert len(src.refresh()) == 1     # unchanged since: it is complete
+    assert src.refresh() is None
+    row = synthetic_sheet(3001, seed=1).splitlines()[-1]
+    with open(path, "ab") as f: f.write(b"\r\n" + row + b"\r\n")
+    assert len(src.refresh()) == 1 and not src.resynced
+    assert_whole_sheet(src, path)
+
+    with open(path, "ab") as f: f.write(row)
+    src.refresh()
+    src.refresh()
+    with open(path, "ab") as f: f.write(b"9")  # the last line was not complete after all
+    assert len(src.refresh()) == 3001 and src.resynced
+    assert len(src.refresh()) == 1
+    assert_whole_sheet(src, path)
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fake_sheet
+from anomaly import SurgeDetector
+from incidents import incidents
+from ingest import Poller, parse_csv_bytes
+from live import LivePipeline, start_poller
+from pipeline import prepare
+from rollups import Rollups
+from sources import open_source
+
+COLUMNS = ["Timestamp", "Detection ID", "Camera", "Location", "Dogs", "Confidence", "Status"]
+
+
+def sheet(n=20_000, days=3, cams=5, seed=0):
+    # detections of a few cameras close enough together that incidents run across midnight
+    rng = np.random.default_rng(seed)
+    secs = np.sort(rng.integers(0, days * 86400, n))
+    ts = pd.Timestamp("2025-03-01", tz="Asia/Kuala_Lumpur") + pd.to_timedelta(secs, "s")
+    cam = rng.integers(0, cams, n)
+    return pd.DataFrame({
+        "Timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S+08:00"),
+        "Detection ID": [f"DET-{i:06d}" for i in range(n)],
+        "Camera": [f"CAM-{c}" for c in cam],
+        "Location": [f"LOC-{c % 2}" for c in cam],
+        "Dogs": rng.integers(1, 5, n),
+        "Confidence": rng.uniform(0.5, 1, n).round(2),
+        "Status": rng.choice(["NEW", "RESOLVED"], n),
+    }, columns=COLUMNS)
+
+
+def feed(tmp_path, rows, batch, hot_days=None, cache_dir=None):
+    """Snapshot after appending ``rows`` to a CSV ``batch`` rows at a time (one poll each),
+    and the whole sheet prepared in one go."""
+    path = tmp_path / "sheet.csv"
+    rows.iloc[:batch].to_csv(path, index=False)
+    src = open_source(str(path), keep_frame=False)
+    poller = Poller(src, 3600, derive=LivePipeline(src, cache_dir, hot_days))
+    poller.poll_once()
+    for lo in range(batch, len(rows), batch):
+        with open(path, "a") as f: f.write(rows.iloc[lo:lo + batch].to_csv(index=False, header=False))
+        poller.poll_once()
+    return poller.snapshot, prepare(parse_csv_bytes(path.read_bytes()))
+
+
+def counted(r: Rollups) -> pd.DataFrame:
+    h = r.hourly
+    return h[h.any(axis=1)].rename_axis(None)
+
+
+def assert_same_counts(got: Rollups, want: Rollups):
+    pd.testing.assert_frame_equal(counted(got), counted(want), check_freq=False)
+    for role, parts in want.parts.items():
+        for label, child in parts.items():
+            pd.testing.assert_frame_equal(counted(got.part(role, label)), counted(child), check_freq=False)
+
+
+@pytest.mark.parametrize("batch", [1, 700, 20_000])
+def test_batches_match_a_full_build(tmp_path, batch):
+    rows = sheet(n=200, days=1) if batch == 1 else sheet()
+    snap, full = feed(tmp_path, rows, batch)
+    inc = incidents(full)
+    # categories are added batch by batch, so only their order may differ
+    pd.testing.assert_frame_equal(snap.data.df, full.df, check_categorical=False)
+    pd.testing.assert_frame_equal(snap.incidents.df, inc.df, check_categorical=False)
+    assert_same_counts(snap.rollups, Rollups().add(full.df, full.cols))
+    assert_same_counts(snap.incident_rollups, Rollups().add(inc.df, inc.cols))
+    surges = SurgeDetector()
+    surges.replay(full)
+    pd.testing.assert_frame_equal(snap.escalations, surges.escalations)
+
+
+@pytest.mark.parametrize("batch", [300, 700, 6_667])
+def test_retention_counts_each_incident_once(tmp_path, batch):
+    rows = sheet()
+    snap, full = feed(tmp_path, rows, batch, hot_days=1)
+    inc = incidents(full)
+    cutoff = snap.rollups.compacted
+    assert cutoff is not None and snap.incident_rollups.compacted == cutoff
+    assert_same_counts(snap.rollups, Rollups().add(full.df, full.cols).compact(cutoff))
+    assert_same_counts(snap.incident_rollups, Rollups().add(inc.df, inc.cols).compact(cutoff))
+    # the incidents kept in memory are whole: none of them is the tail of a compacted one
+    kept = inc.window(snap.incidents.df["ts"].iat[-1])
+    assert sorted(snap.incidents.df["uid"]) == sorted(kept["uid"])
+    assert snap.incidents.df["detections"].sum() == kept["detections"].sum()
+
+
+def test_warm_start_after_retention(tmp_path):
+    rows = sheet(n=8_000)
+    cache = str(tmp_path / "cache")
+    snap, _ = feed(tmp_path, rows, 700, hot_days=1, cache_dir=cache)
+    src = open_source(str(tmp_path / "sheet.csv"), keep_frame=False)
+    warm = LivePipeline(src, cache, 1).warm_start()
+    assert len(warm.data) == len(snap.data)
+    assert_same_counts(warm.rollups, snap.rollups)
+    assert_same_counts(warm.incident_rollups, snap.incident_rollups)
+    assert sorted(warm.incidents.df["uid"]) == sorted(snap.incidents.df["uid"])
+
+
+def test_warm_start_serves_the_cache_while_the_sheet_is_down(tmp_path):
+    path = tmp_path / "sheet.csv"
+    sheet(n=2_000).to_csv(path, index=False)
+    cache = str(tmp_path / "cache")
+    server = fake_sheet.serve(str(path))
+    url = "http://%s:%d/sheet.csv" % server.server_address
+    start_poller(url, 3600, cache).stop()
+    server.shutdown()
+    server.server_close()
+
+    poller = start_poller(url, 3600, cache)
+    try:
+        assert poller.error is not None
+        assert len(poller.snapshot.data) == 2_000 and poller.snapshot.fetched_at == 0.0
+    finally:
+        poller.stop()
+    with pytest.raises(OSError): start_poller(url, 3600)  # nothing to fall back on
@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import urllib.request
+from urllib.error import HTTPError
+
+import pandas as pd
+import pytest
+
+import store
+from ingest import Poller
+from live import LivePipeline, recent
+from sources import open_source
+
+
+def post(src, body):
+    req = urllib.request.Request("http://%s:%d/" % src.address, data=json.dumps(body).encode())
+    with urllib.request.urlopen(req, timeout=5) as r: return r.status, json.loads(r.read())
+
+
+@pytest.fixture
+def push(tmp_path):
+    src = open_source("push://127.0.0.1:0", keep_frame=False)
+    cache = str(tmp_path / "cache")
+    yield src, Poller(src, 3600, derive=LivePipeline(src, cache)), cache
+    src.close()
+
+
+def test_push_rows_reach_the_snapshot(push):
+    src, poller, cache = push
+    assert post(src, [{"Timestamp": "2026-10-16T08:00:00+08:00", "Dogs": 2, "Camera": "CAM-01"},
+                      {"Timestamp": "2026-10-16T08:05:00+08:00", "Dogs": 3, "Camera": "CAM-02"}]) == (202, {"accepted": 2})
+    poller.poll_once()
+    assert len(poller.snapshot.data) == 2
+
+    with pytest.raises(HTTPError) as e: post(src, {"Dogs": 4, "Camera": "CAM-01"})
+    assert e.value.code == 400
+    assert poller.poll_once() is False  # nothing was queued
+
+    assert post(src, {"Timestamp": "2026-10-16T08:10:00+08:00", "Dogs": 1, "Camera": "CAM-01"})[0] == 202
+    poller.poll_once()
+    assert len(poller.snapshot.data) == 3
+    assert len(store.load(cache, src.source)[0]) == 3
+
+
+def test_rows_without_a_timestamp_keep_the_snapshot(push):
+    src, poller, cache = push
+    post(src, {"Timestamp": "2026-10-16T08:00:00+08:00", "Dogs": 2, "Camera": "CAM-01"})
+    poller.poll_once()
+    before = poller.snapshot
+    src.push([{"Dogs": 4, "Camera": "CAM-01"}])  # bypassing the endpoint's check
+    poller.poll_once()
+    assert poller.snapshot.data is before.data and poller.snapshot.rollups is before.rollups
+    assert len(store.load(cache, src.source)[0]) == 1
+
+
+def test_bad_jsonl_line_keeps_the_snapshot(tmp_path):
+    path = tmp_path / "detections.jsonl"
+    row = lambda m: json.dumps({"Timestamp": f"2026-10-16T08:{m:02d}:00+08:00", "Dogs": 2, "Camera": "CAM-01"}) + "\n"
+    path.write_text("".join(row(m) for m in range(5)))
+    src = open_source(str(path), keep_frame=False)
+    poller = Poller(src, 3600, derive=LivePipeline(src))
+    poller.poll_once()
+    assert len(poller.snapshot.data) == 5
+    with open(path, "a") as f: f.write("not json\n")
+    poller.poll_once()
+    assert len(poller.snapshot.data) == 5
+    with open(path, "a") as f: f.write(row(5))
+    poller.poll_once()
+    assert len(poller.snapshot.data) == 6 and src.resyncs == 0
+
+
+@pytest.mark.parametrize("fmt, pushed_down", [("%Y-%m-%dT%H:%M:%S+08:00", True), ("%d/%m/%Y %H:%M", False)])
+def test_sqlite_range_query_only_on_iso_text(tmp_path, fmt, pushed_down):
+    path = tmp_path / "detections.db"
+    ts = pd.date_range("2026-10-15 22:00", periods=10, freq="37min")
+    with sqlite3.connect(path) as con:
+        con.execute('CREATE TABLE detections ("Timestamp" TEXT, "Detection ID" TEXT, "Dogs" INTEGER)')
+        con.executemany("INSERT INTO detections VALUES (?, ?, ?)", [(t.strftime(fmt), f"DET-{i}", 2) for i, t in enumerate(ts)])
+    src = open_source(f"sqlite:///{path}")
+    poller = Poller(src, 3600, derive=LivePipeline(src))
+    poller.poll_once()
+    day = pd.Timestamp("2026-10-16", tz="Asia/Kuala_Lumpur")
+    assert (src.window(day) is not None) == pushed_down
+    got = recent(poller, poller.snapshot.data, day, day + pd.Timedelta(days=1))
+    assert list(got["detection_id"]) == [f"DET-{i}" for i in range(9, 3, -1)]